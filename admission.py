@@ -0,0 +1,276 @@
+"""
+Admission control for the analysis endpoints.
+
+Every analysis request is priced before it starts, in weighted seconds of
+audio estimated from the upload's header and size. A request is admitted
+only if its client has enough quota left (a token bucket per API key or
+client address) and the process has spare capacity; otherwise it waits in
+a priority queue, where interactive calls go ahead of bulk work, for at
+most ADMISSION_MAX_WAIT seconds. Requests that cannot be admitted get
+429 Too Many Requests with a Retry-After header.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import struct
+import time
+
+from fastapi import HTTPException, Request
+
+# Queue priorities; lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Relative cost of one second of audio per analysis
+COST_WEIGHTS = {
+    "transcription": 1.0,
+    "sentiment": 1.0,   # transcribes first
+    "gender": 0.3,
+    "metadata": 0.05,
+    "temporal": 0.5,
+    "diarization": 1.5,
+    "case": 3.5,        # every stage
+}
+
+# Typical bitrates (bits/s) for compressed formats whose duration is not in the header
+_NOMINAL_BITRATES = {
+    ".mp3": 128_000,
+    ".m4a": 128_000,
+    ".aac": 128_000,
+    ".ogg": 112_000,
+    ".wma": 128_000,
+}
+_DEFAULT_BITRATE = 128_000
+
+# Longest Retry-After we ever suggest
+MAX_RETRY_AFTER = 300
+
+# API keys that get a quota of their own; any other request is keyed by its address
+API_KEYS = frozenset(key.strip() for key in os.getenv("ADMISSION_API_KEYS", "").split(",") if key.strip())
+
+
+def estimate_duration(header: bytes, size: int, filename: str) -> float:
+    """Approximate audio length in seconds from the first bytes and the size of a file"""
+    ext = os.path.splitext(filename or "")[1].lower()
+
+    if header[:4] in (b"RIFF", b"RF64") and header[8:12] == b"WAVE":
+        fmt = header.find(b"fmt ")
+        if fmt >= 0 and len(header) >= fmt + 24:
+            byte_rate = struct.unpack_from("<I", header, fmt + 16)[0]
+            if byte_rate:
+                return size / byte_rate
+
+    if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+        comm = header.find(b"COMM")
+        if comm >= 0 and len(header) >= comm + 22:
+            frames = struct.unpack_from(">I", header, comm + 10)[0]
+            # Sample rate is an 80-bit extended float; its exponent and top mantissa bits suffice
+            exponent, mantissa = struct.unpack_from(">HI", header, comm + 16)
+            rate = mantissa * 2.0 ** (exponent - 16383 - 31)
+            if rate and frames:
+                return frames / rate
+
+    if header[:4] == b"fLaC" and len(header) >= 26:
+        # STREAMINFO: 20-bit sample rate, 3-bit channels, 5-bit depth, 36-bit sample count
+        packed = int.from_bytes(header[18:26], "big")
+        rate = packed >> 44
+        total_samples = packed & ((1 << 36) - 1)
+        if rate and total_samples:
+            return total_samples / rate
+        if rate:
+            channels = ((packed >> 41) & 0x7) + 1
+            bits = ((packed >> 36) & 0x1F) + 1
+            # Lossless compression typically halves PCM size
+            return size / (rate * channels * bits / 8 * 0.5)
+
+    return size * 8 / _NOMINAL_BITRATES.get(ext, _DEFAULT_BITRATE)
+
+
+def client_key(request: Request) -> str:
+    """Quota key of a request: its API key if it is a configured one, otherwise its address
+
+    Unknown keys are ignored, so sending a fresh key does not buy a fresh quota.
+    """
+    api_key = request.headers.get("x-api-key")
+    if api_key and api_key in API_KEYS:
+        return f"key:{api_key}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class AdmissionRejected(HTTPException):
+    """429 response telling the client when to retry"""
+
+    def __init__(self, detail: str, retry_after: float):
+        self.retry_after = max(1, min(MAX_RETRY_AFTER, math.ceil(retry_after)))
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdmissionTicket:
+    """Capacity held by one admitted request"""
+
+    def __init__(self, cost: float):
+        self.cost = cost
+        self.started = time.monotonic()
+        self.released = False
+
+
+class AdmissionController:
+    """Cost-aware admission with per-client quotas and a priority wait queue"""
+
+    def __init__(self, capacity: float = 10800, max_wait: float = 30, max_queued: float = None,
+                 client_rate: float = 2.0, client_burst: float = 21600):
+        # Weighted audio seconds that may be in analysis at once
+        self.capacity = capacity
+        self.max_wait = max_wait
+        # Weighted audio seconds that may wait for capacity
+        self.max_queued = capacity if max_queued is None else max_queued
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.in_use = 0.0
+        self.queued = 0.0
+        self._running = 0
+        self._waiters = []            # heap of [priority, seq, cost, future]
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._sweep_at = 10000        # bucket count that triggers forgetting idle clients
+        self._speed = None            # EWMA of cost units finished per second per request
+
+    def _bucket(self, client: str) -> _TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self._sweep_at:
+                # Forget clients whose buckets have refilled completely; sweeping
+                # again only after the table doubles keeps this amortized O(1)
+                for key, old in list(self._buckets.items()):
+                    old.refill()
+                    if old.tokens >= old.burst:
+                        del self._buckets[key]
+                self._sweep_at = max(10000, 2 * len(self._buckets))
+            bucket = self._buckets[client] = _TokenBucket(self.client_rate, self.client_burst)
+        bucket.refill()
+        return bucket
+
+    def charge(self, client: str, cost: float):
+        """Take cost from the client's quota, or raise AdmissionRejected"""
+        if self.client_rate <= 0:
+            return
+        bucket = self._bucket(client)
+        # A request larger than the whole burst is allowed once the bucket is full
+        needed = min(cost, bucket.burst)
+        if bucket.tokens < needed:
+            raise AdmissionRejected("Analysis quota exceeded", (needed - bucket.tokens) / bucket.rate)
+        bucket.tokens -= needed
+
+    def _retry_after(self, backlog: float) -> float:
+        if not self._speed:
+            return self.max_wait
+        return backlog / (self._speed * max(1, self._running))
+
+    def _fits(self, cost: float) -> bool:
+        return self.in_use + cost <= self.capacity or self._running == 0
+
+    async def acquire(self, client: str, cost: float, priority: int = PRIORITY_BULK) -> AdmissionTicket:
+        """Charge the client's quota and wait for capacity; raises AdmissionRejected"""
+        # A job bigger than the whole capacity runs alone rather than never
+        cost = min(max(cost, 0.0), self.capacity)
+        self.charge(client, cost)
+
+        ahead = any(waiter[0] <= priority for waiter in self._waiters)
+        if not ahead and self._fits(cost):
+            return self._admit(cost)
+
+        if self.queued + cost > self.max_queued:
+            self._refund(client, cost)
+            raise AdmissionRejected("Analysis capacity is full",
+                                    self._retry_after(self.in_use + self.queued + cost - self.capacity))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), cost, future]
+        heapq.heappush(self._waiters, entry)
+        self.queued += cost
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait ended; give the capacity back
+                self.release(future.result())
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self.queued -= cost
+                self._dispatch()
+            self._refund(client, cost)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise AdmissionRejected("Analysis capacity is full",
+                                    self._retry_after(self.in_use + self.queued - self.capacity + cost))
+
+    def _refund(self, client: str, cost: float):
+        if self.client_rate > 0:
+            bucket = self._bucket(client)
+            bucket.tokens = min(bucket.burst, bucket.tokens + min(cost, bucket.burst))
+
+    def _admit(self, cost: float) -> AdmissionTicket:
+        self.in_use += cost
+        self._running += 1
+        return AdmissionTicket(cost)
+
+    def _dispatch(self):
+        # Strict priority order: the head waits until it fits, so large jobs are not starved
+        while self._waiters and self._fits(self._waiters[0][2]):
+            _, _, cost, future = heapq.heappop(self._waiters)
+            self.queued -= cost
+            if not future.cancelled():
+                future.set_result(self._admit(cost))
+
+    def release(self, ticket: AdmissionTicket):
+        """Return an admitted request's capacity"""
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        self.in_use = max(0.0, self.in_use - ticket.cost)
+        self._running -= 1
+        elapsed = time.monotonic() - ticket.started
+        if ticket.cost and elapsed > 0:
+            speed = ticket.cost / elapsed
+            self._speed = speed if self._speed is None else 0.8 * self._speed + 0.2 * speed
+        self._dispatch()
+
+    def stats(self) -> dict:
+        """Current load, for monitoring"""
+        return {
+            "capacity": self.capacity,
+            "in_use": round(self.in_use, 1),
+            "running": self._running,
+            "queued": round(self.queued, 1),
+            "waiting": len(self._waiters),
+        }
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Build a controller from ADMISSION_* environment variables"""
+        capacity = float(os.getenv("ADMISSION_CAPACITY", "10800"))
+        return cls(
+            capacity=capacity,
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "30")),
+            max_queued=float(os.getenv("ADMISSION_MAX_QUEUED", str(capacity))),
+            client_rate=float(os.getenv("ADMISSION_CLIENT_RATE", "2")),
+            client_burst=float(os.getenv("ADMISSION_CLIENT_BURST", "21600"))
+        )
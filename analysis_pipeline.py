@@ -0,0 +1,433 @@
+"""
+Analysis pipeline shared by case creation and re-analysis.
+
+Every stage records the analyzer version and the hash of the input it was
+computed from, so a later run can recompute only the stages whose analyzer
+was upgraded or whose input changed.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+
+from transcribe import transcribe_audio
+from sentiment_analysis import get_sentiment
+from diarization import run_diarization
+from gender_detection import process_audio
+from temporal_inconsistency import analyze_audio_splices
+from metadata import extract_audio_metadata
+
+from database.blob_store import SEGMENTS_DIR, segment_store, store_segment_files
+from database.services import AudioForensicsService
+from speaker_index import compute_speaker_embeddings
+from fingerprint import compute_fingerprint, fingerprint_duration
+from reaper import TEMP_PREFIX
+from vad import detect_speech, speech_seconds, to_original_time, write_clips, write_voiced_audio
+
+# Stages in execution order; later stages may depend on earlier ones
+STAGES = ("transcription", "sentiment", "gender", "metadata", "temporal", "diarization")
+
+# Stages whose input is the output of another stage
+DEPENDENT_STAGES = {
+    "transcription": ("sentiment",),
+}
+
+# Stages whose results describe the speech itself and can be taken over
+# from a near-duplicate recording instead of rerunning inference
+REUSABLE_STAGES = ("transcription", "sentiment", "gender", "diarization")
+
+# Whole-file results (transcript, sentiment, gender) are only reused when the
+# duplicate covers nearly all of both recordings; aligned segments always are
+FULL_REUSE_COVERAGE = 0.9
+
+# Stages that only need the voiced parts of a recording. Temporal analysis
+# looks for splices anywhere, so it always gets the full file.
+SPEECH_STAGES = ("transcription", "gender", "diarization")
+
+# Speech stages analyze a voiced-only copy unless speech covers more than
+# this share of the recording (the copy would save too little to be worth it)
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+VAD_MAX_SPEECH_RATIO = float(os.getenv("VAD_MAX_SPEECH_RATIO", "0.9"))
+
+# Bump a version when the analyzer (or model) behind a stage changes.
+# ANALYZER_VERSION_<STAGE> overrides the default for a deployment.
+_DEFAULT_VERSIONS = {
+    "transcription": "1",
+    "sentiment": "1",
+    "gender": "1",
+    "metadata": "1",
+    "temporal": "1",
+    "diarization": "2",  # 2: MFCC speaker embeddings without c0
+}
+
+ANALYZER_VERSIONS = {
+    stage: os.getenv(f"ANALYZER_VERSION_{stage.upper()}", version)
+    for stage, version in _DEFAULT_VERSIONS.items()
+}
+
+
+def hash_bytes(content: bytes) -> str:
+    """SHA-256 hex digest of raw bytes"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_input_hash(case, stage: str) -> str:
+    """Hash of the input a stage consumes for this case"""
+    if stage == "sentiment":
+        return hash_bytes((case.transcription_text or "").encode("utf-8"))
+    return case.file_hash
+
+
+def stale_stages(case, stages=STAGES) -> list:
+    """Stages whose stored result is missing, failed, or from another analyzer version or input"""
+    recorded = case.analysis_versions or {}
+    stale = []
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        entry = recorded.get(stage)
+        if (
+            getattr(case, f"{stage}_completed") != "completed"
+            or not entry
+            or entry.get("version") != ANALYZER_VERSIONS[stage]
+            or entry.get("input_hash") != stage_input_hash(case, stage)
+        ):
+            stale.append(stage)
+    return stale
+
+
+def expand_dependents(stages) -> list:
+    """Add stages that consume the output of any stage in the list"""
+    expanded = set(stages)
+    for stage in stages:
+        expanded.update(DEPENDENT_STAGES.get(stage, ()))
+    return [stage for stage in STAGES if stage in expanded]
+
+
+def plan_stages(case, stages=STAGES, force: bool = False) -> list:
+    """Stages a re-analysis would run: stale ones, plus dependents of any that rerun"""
+    selected = expand_dependents(stages)
+    todo = selected if force else stale_stages(case, selected)
+    return expand_dependents(todo)
+
+
+class AnalysisPipeline:
+    """Runs analysis stages for a case and stores the results"""
+
+    def __init__(self, service: AudioForensicsService, pool, events=None, fingerprints=None, speakers=None):
+        self.service = service
+        self.pool = pool
+        # Optional progress broker (see progress.py)
+        self.events = events
+        # Optional fingerprint index for the near-duplicate precheck (see fingerprint.py)
+        self.fingerprints = fingerprints
+        # Optional speaker index kept current with new diarizations (see speaker_index.py)
+        self.speakers = speakers
+
+    async def run(self, case, audio_path: str, stages=STAGES, file_content: bytes = None,
+                  check_duplicates: bool = False, reuse_duplicates: bool = False):
+        """Run the given stages in pipeline order, recording analyzer provenance
+
+        check_duplicates fingerprints the audio and flags near-duplicate cases;
+        reuse_duplicates also takes speech results over from the best match.
+        """
+        case_id = case.id
+        context = {"audio_path": audio_path, "file_content": file_content}
+        try:
+            if not case.file_hash:
+                file_hash = hash_bytes(file_content) if file_content is not None else hash_file(audio_path)
+                case = self.service.set_file_hash(case_id, file_hash)
+            # Stages an earlier run failed or skipped are pending again while this one runs
+            case = self.service.mark_stages(case_id, stages, "pending", only=("failed", "skipped")) or case
+            if check_duplicates and self.fingerprints is not None:
+                stages = await self._precheck_duplicates(case, context, stages, reuse_duplicates)
+            if VAD_ENABLED and any(stage in stages for stage in SPEECH_STAGES):
+                case = await self._prepare_voiced_audio(case, context)
+            for stage in STAGES:
+                if stage not in stages:
+                    continue
+                await self._publish(case_id, "stage_started", stage=stage)
+                try:
+                    completed = await getattr(self, f"_run_{stage}")(case, context)
+                except Exception as e:
+                    self.service.mark_stage_failed(case_id, stage)
+                    await self._publish(case_id, "stage_failed", stage=stage, error=str(e))
+                    raise
+                case = self.service.get_case(case_id)
+                if case is None:
+                    await self._publish(case_id, "case_failed", error="Case was deleted")
+                    return None
+                if completed:
+                    case = self.service.record_analysis_version(
+                        case_id, stage, ANALYZER_VERSIONS[stage], stage_input_hash(case, stage)
+                    )
+                    await self._publish(case_id, "stage_completed", stage=stage, result=self._stage_result(case, stage))
+                else:
+                    self.service.mark_stage_failed(case_id, stage)
+                    await self._publish(case_id, "stage_failed", stage=stage, error="Analyzer reported failure")
+        except (Exception, asyncio.CancelledError) as e:
+            # Stage failures, anything before the first stage (hashing, duplicate precheck, VAD)
+            # and cancellation; stages that never ran are marked skipped so none stays pending
+            try:
+                self.service.db.rollback()
+                self.service.mark_stages(case_id, stages, "skipped", only=("pending",))
+            except Exception as mark_error:
+                print(f"Error marking skipped stages for case {case_id}: {mark_error}")
+            await self._publish(case_id, "case_failed", error=str(e) or "Analysis was cancelled")
+            raise
+        finally:
+            if context.get("voiced_path"):
+                try:
+                    os.remove(context["voiced_path"])
+                except OSError:
+                    pass
+        await self._publish(case_id, "case_completed")
+        return case
+
+    async def _prepare_voiced_audio(self, case, context):
+        """Find speech once per case and write a voiced-only copy for the speech stages"""
+        if case.speech_intervals is None:
+            try:
+                speech = await self.pool.run(detect_speech, context["audio_path"])
+            except Exception as e:
+                print(f"Error detecting speech in case {case.id}: {e}")
+                return case
+            case = self.service.update_speech_intervals(case.id, speech["intervals"], speech["duration"])
+            await self._publish(case.id, "speech_detected", duration=speech["duration"],
+                                speech_seconds=speech_seconds(speech["intervals"]))
+
+        intervals = case.speech_intervals
+        # Without any detected speech, analyze everything rather than nothing
+        if not intervals or not case.audio_duration \
+                or speech_seconds(intervals) > VAD_MAX_SPEECH_RATIO * case.audio_duration:
+            return case
+
+        fd, voiced_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=".wav")
+        os.close(fd)
+        try:
+            written = await self.pool.run(write_voiced_audio, context["audio_path"], intervals, voiced_path)
+        except Exception as e:
+            print(f"Error writing voiced audio for case {case.id}: {e}")
+            os.remove(voiced_path)
+            return case
+        context["voiced_path"] = voiced_path
+        # Sample-exact regions of the copy, for mapping times back
+        context["speech_intervals"] = written
+        return case
+
+    def _speech_path(self, context) -> str:
+        return context.get("voiced_path") or context["audio_path"]
+
+    async def _precheck_duplicates(self, case, context, stages, reuse: bool):
+        """Fingerprint the audio, flag near-duplicates and optionally reuse their results"""
+        try:
+            fingerprint = await self.pool.run(compute_fingerprint, context["audio_path"])
+        except Exception as e:
+            print(f"Error fingerprinting case {case.id}: {e}")
+            return stages
+
+        db = self.service.db
+        self.fingerprints.refresh(db)
+        matches = self.fingerprints.find_near_duplicates(db, case.id, fingerprint)
+        self.service.update_fingerprint(case.id, fingerprint, matches)
+        self.fingerprints.add_case(case.id, fingerprint)
+        if not matches:
+            return stages
+        await self._publish(case.id, "near_duplicates", matches=matches)
+        if not reuse:
+            return stages
+
+        best = matches[0]
+        reusable = [stage for stage in REUSABLE_STAGES if stage in stages]
+        if best["coverage"] < FULL_REUSE_COVERAGE:
+            reusable = [stage for stage in reusable if stage == "diarization"]
+        copied = self.service.copy_analyses(
+            case.id, best["case_id"], reusable,
+            offset_seconds=best["offset_seconds"],
+            duration=fingerprint_duration(fingerprint)
+        )
+
+        source = self.service.get_case(best["case_id"])
+        source_versions = (source.analysis_versions or {}) if source else {}
+        for stage in copied:
+            case = self.service.get_case(case.id)
+            if stage == "diarization" and self.speakers is not None:
+                self.speakers.add_case(case.id, case.speaker_embeddings)
+            version = source_versions.get(stage, {}).get("version", ANALYZER_VERSIONS[stage])
+            case = self.service.record_analysis_version(
+                case.id, stage, version, stage_input_hash(case, stage), reused_from=best["case_id"]
+            )
+            await self._publish(case.id, "stage_completed", stage=stage, reused_from=best["case_id"],
+                                result=self._stage_result(case, stage))
+        return [stage for stage in stages if stage not in copied]
+
+    async def _publish(self, case_id: str, event_type: str, **data):
+        if self.events is None:
+            return
+        try:
+            await self.events.publish(case_id, {"type": event_type, "case_id": case_id, **data})
+        except Exception as e:
+            print(f"Error publishing progress event: {e}")
+
+    @staticmethod
+    def _stage_result(case, stage: str):
+        """Partial results worth pushing to clients as soon as a stage finishes"""
+        if stage == "transcription":
+            return {"text": case.transcription_text}
+        if stage == "sentiment":
+            return {"sentiment": case.sentiment_result}
+        if stage == "gender":
+            return {"gender": case.gender_result}
+        if stage == "temporal":
+            return {"combined_splices": case.combined_splices}
+        if stage == "diarization":
+            return {"estimated_speakers": case.estimated_speakers, "segments": case.diarization_segments}
+        return None
+
+    async def run_stale(self, case, audio_path: str, stages=STAGES, force: bool = False) -> list:
+        """Recompute only stale stages (and their dependents); returns the stages that ran"""
+        todo = plan_stages(case, stages, force)
+        if todo:
+            await self.run(case, audio_path, stages=todo)
+        return todo
+
+    def _file_content(self, context) -> bytes:
+        if context["file_content"] is None:
+            with open(context["audio_path"], "rb") as f:
+                context["file_content"] = f.read()
+        return context["file_content"]
+
+    async def _run_transcription(self, case, context) -> bool:
+        if context.get("voiced_path"):
+            with open(context["voiced_path"], "rb") as f:
+                content = f.read()
+            filename = os.path.splitext(case.original_filename)[0] + ".wav"
+        else:
+            content, filename = self._file_content(context), case.original_filename
+        transcription_text = await self.pool.run(transcribe_audio, content, filename)
+        self.service.update_transcription(case.id, transcription_text)
+        return True
+
+    async def _run_sentiment(self, case, context) -> bool:
+        sentiment_result = await self.pool.run(get_sentiment, case.transcription_text)
+        self.service.update_sentiment(case.id, sentiment_result)
+        return True
+
+    async def _run_gender(self, case, context) -> bool:
+        gender_result = await self.pool.run(process_audio, self._speech_path(context))
+        if isinstance(gender_result, dict):
+            gender = gender_result.get("gender", str(gender_result))
+        else:
+            gender = str(gender_result)
+        self.service.update_gender_detection(case.id, gender)
+        return True
+
+    async def _run_metadata(self, case, context) -> bool:
+        metadata_result = await self.pool.run(
+            extract_audio_metadata,
+            filepath=context["audio_path"],
+            original_filename=case.original_filename
+        )
+        if not metadata_result["success"]:
+            return False
+        self.service.update_metadata(case.id, metadata_result["metadata"])
+        return True
+
+    async def _run_temporal(self, case, context) -> bool:
+        bg_res, phase_res, high_confidence_splices = await self.pool.run(
+            analyze_audio_splices, context["audio_path"]
+        )
+
+        background_splices = [
+            {"time": float(time), "confidence": float(conf)}
+            for time, conf in zip(bg_res['times'], bg_res.get('confidence', []))
+        ]
+
+        phase_splices = [
+            {"time": float(time), "confidence": float(conf)}
+            for time, conf in zip(phase_res['times'], phase_res.get('confidence', []))
+        ]
+
+        combined_splices = [
+            {"time": float(splice['time']),
+             "confidence": float(splice['confidence']),
+             "methods": splice['methods']}
+            for splice in high_confidence_splices
+        ]
+
+        self.service.update_temporal_analysis(case.id, background_splices, phase_splices, combined_splices)
+        return True
+
+    async def _run_diarization(self, case, context) -> bool:
+        diarization_results = await self.pool.run(
+            run_diarization,
+            self._speech_path(context),
+            segments_dir=SEGMENTS_DIR,
+            public_base="/static/segments"
+        )
+
+        # Segment WAVs are re-encoded as FLAC and deduplicated in the segment store
+        segments = diarization_results.get('segments', [])
+        segment_paths = [
+            os.path.join(SEGMENTS_DIR, os.path.basename(segment['file_url']))
+            for segment in segments
+        ]
+
+        # Times on the voiced-only copy are mapped back to the original recording
+        starts = [float(segment['start']) for segment in segments]
+        ends = [float(segment['end']) for segment in segments]
+        if context.get("speech_intervals") and segments:
+            starts = [round(float(t), 3) for t in to_original_time(starts, context["speech_intervals"])]
+            ends = [round(float(t), 3) for t in to_original_time(ends, context["speech_intervals"], end=True)]
+            # Clips cut from the copy would splice across removed silence; recut
+            # them from the original so each clip is one contiguous span of evidence
+            await self.pool.run(write_clips, context["audio_path"], list(zip(starts, ends, segment_paths)))
+
+        file_urls = await self.pool.run(store_segment_files, segment_store, segment_paths)
+
+        segments_data = []
+        for segment, file_url, start, end in zip(segments, file_urls, starts, ends):
+            segments_data.append({
+                'speaker': segment['speaker'],
+                'start': start,
+                'end': end,
+                'file_url': file_url,
+                'transcription': None,  # Will be filled by segment analysis
+                'sentiment': None,      # Will be filled by segment analysis
+                'gender': None          # Will be filled by segment analysis
+            })
+
+        # One embedding per speaker for cross-case voice matching
+        speaker_embeddings = diarization_results.get('speaker_embeddings')
+        if not speaker_embeddings and segments:
+            try:
+                speaker_embeddings = await self.pool.run(
+                    compute_speaker_embeddings, self._speech_path(context), segments
+                )
+            except Exception as e:
+                print(f"Error computing speaker embeddings for case {case.id}: {e}")
+                speaker_embeddings = None
+        if speaker_embeddings:
+            speaker_embeddings = {
+                str(speaker): [float(x) for x in vector] for speaker, vector in speaker_embeddings.items()
+            }
+
+        self.service.update_diarization(
+            case.id,
+            diarization_results.get('estimated_speakers', 0),
+            segments_data,
+            speaker_embeddings
+        )
+        if self.speakers is not None:
+            self.speakers.add_case(case.id, speaker_embeddings)
+        return True
@@ -0,0 +1,362 @@
+"""
+Supervised process pool for running CPU-bound analyzers outside the API process.
+
+Each analyzer call runs in a dedicated worker process. A supervisor thread
+enforces a per-task timeout and a resident-memory cap, kills only the
+offending worker when a limit is hit, and recycles workers after a fixed
+number of tasks. Large numpy arrays in results are handed back through
+shared memory instead of being pickled over the pipe.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import connection, resource_tracker, shared_memory
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the shared-memory fast path
+    np = None
+
+# Arrays smaller than this are cheaper to pickle than to map
+SHARED_ARRAY_MIN_BYTES = 64 * 1024
+
+
+class AnalyzerError(RuntimeError):
+    """Base class for failures raised by the analyzer pool"""
+
+
+class AnalyzerTimeout(AnalyzerError):
+    """The analyzer did not finish within its time budget"""
+
+
+class AnalyzerMemoryExceeded(AnalyzerError):
+    """The analyzer worker grew past the configured RSS limit"""
+
+
+class AnalyzerCrashed(AnalyzerError):
+    """The analyzer worker exited without returning a result"""
+
+
+class _SharedArray:
+    """Picklable handle to a numpy array parked in shared memory"""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _export_arrays(obj):
+    """Replace large numpy arrays in a result with shared-memory handles"""
+    if np is not None and isinstance(obj, np.ndarray):
+        if obj.nbytes < SHARED_ARRAY_MIN_BYTES or obj.dtype.hasobject:
+            return obj
+        shm = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+        np.ndarray(obj.shape, dtype=obj.dtype, buffer=shm.buf)[...] = obj
+        # Ownership moves to the parent, which unlinks after copying out
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.close()
+        return _SharedArray(shm.name, obj.shape, obj.dtype.str)
+    if isinstance(obj, dict):
+        return {key: _export_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return tuple(_export_arrays(item) for item in obj)
+    if isinstance(obj, list):
+        return [_export_arrays(item) for item in obj]
+    return obj
+
+
+def _import_arrays(obj):
+    """Materialise shared-memory handles back into numpy arrays"""
+    if isinstance(obj, _SharedArray):
+        shm = shared_memory.SharedMemory(name=obj.name)
+        try:
+            return np.ndarray(obj.shape, dtype=np.dtype(obj.dtype), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+    if isinstance(obj, dict):
+        return {key: _import_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return tuple(_import_arrays(item) for item in obj)
+    if isinstance(obj, list):
+        return [_import_arrays(item) for item in obj]
+    return obj
+
+
+def _discard_arrays(obj):
+    """Unlink shared memory for a result nobody is going to read"""
+    try:
+        _import_arrays(obj)
+    except Exception:
+        pass
+
+
+def _worker_main(conn):
+    """Worker loop: run tasks sent by the supervisor until told to stop"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        func, args, kwargs = task
+        try:
+            result = func(*args, **kwargs)
+            conn.send(("ok", _export_arrays(result)))
+        except Exception as e:
+            # Analyzer exceptions may pickle here yet fail to unpickle in the
+            # parent (e.g. extra required __init__ args), so only text crosses.
+            # The traceback is for the server log; the message may reach clients.
+            error = AnalyzerError(f"{type(e).__name__}: {e}")
+            error.remote_traceback = traceback.format_exc()
+            conn.send(("error", error))
+
+
+def _rss_bytes(pid):
+    """Resident set size of a process, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Task:
+    def __init__(self, func, args, kwargs, timeout):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.future = Future()
+        self.started_at = None
+
+
+class _Worker:
+    def __init__(self, ctx, index):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn,),
+            name=f"analyzer-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.tasks_done = 0
+
+    def exit_code(self):
+        """Exit code of a worker that has died, waiting briefly for it to be reaped"""
+        self.process.join(timeout=1)
+        return self.process.exitcode
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class AnalyzerPool:
+    """Supervised pool of analyzer worker processes"""
+
+    def __init__(self, workers: int = 2, task_timeout: float = 900, max_rss_mb: int = 4096,
+                 max_tasks_per_worker: int = 20, start_method: str = "spawn"):
+        self.workers = workers
+        self.task_timeout = task_timeout
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._ctx = multiprocessing.get_context(start_method)
+        self._pending = deque()
+        self._pool = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._supervisor = None
+        self._ids = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "AnalyzerPool":
+        """Build a pool from ANALYZER_* environment variables"""
+        return cls(
+            workers=int(os.getenv("ANALYZER_WORKERS", "2")),
+            task_timeout=float(os.getenv("ANALYZER_TASK_TIMEOUT", "900")),
+            max_rss_mb=int(os.getenv("ANALYZER_MAX_RSS_MB", "4096")),
+            max_tasks_per_worker=int(os.getenv("ANALYZER_MAX_TASKS_PER_WORKER", "20")),
+            start_method=os.getenv("ANALYZER_START_METHOD", "spawn"),
+        )
+
+    def start(self):
+        """Spawn workers and the supervisor thread"""
+        with self._lock:
+            if self._supervisor is not None:
+                return
+            self._pool = [self._spawn() for _ in range(self.workers)]
+            self._supervisor = threading.Thread(target=self._supervise, name="analyzer-supervisor", daemon=True)
+            self._supervisor.start()
+
+    def shutdown(self):
+        """Stop all workers and fail any task that never started"""
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending)
+            self._pending.clear()
+        self._wakeup.set()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout=10)
+        for task in pending:
+            task.future.set_exception(AnalyzerError("Analyzer pool is shutting down"))
+        for worker in self._pool:
+            if worker.task is not None:
+                worker.kill()
+                worker.task.future.set_exception(AnalyzerError("Analyzer pool is shutting down"))
+            else:
+                worker.stop()
+        self._pool = []
+
+    def submit(self, func, *args, timeout: float = None, **kwargs) -> Future:
+        """Queue func(*args, **kwargs) for a worker; func must be importable by name"""
+        task = _Task(func, args, kwargs, timeout or self.task_timeout)
+        with self._lock:
+            if self._closed:
+                raise AnalyzerError("Analyzer pool is shut down")
+            self._pending.append(task)
+        if self._supervisor is None:
+            self.start()
+        self._wakeup.set()
+        return task.future
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """Await an analyzer call without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(func, *args, timeout=timeout, **kwargs))
+
+    def _spawn(self):
+        return _Worker(self._ctx, next(self._ids))
+
+    def _replace(self, worker):
+        index = self._pool.index(worker)
+        self._pool[index] = self._spawn()
+
+    def _fail(self, worker, error):
+        """Kill a worker, replace it and fail the task it was running"""
+        task = worker.task
+        worker.task = None
+        worker.kill()
+        self._replace(worker)
+        if task is not None and not task.future.done():
+            task.future.set_exception(error)
+
+    def _supervise(self):
+        # The supervisor must outlive any single bad result, or every later call hangs
+        while not self._closed:
+            try:
+                self._dispatch()
+
+                busy = {worker.conn: worker for worker in self._pool if worker.task is not None}
+                if busy:
+                    ready = connection.wait(list(busy), timeout=0.1)
+                    for conn in ready:
+                        worker = busy[conn]
+                        try:
+                            self._collect(worker)
+                        except Exception as e:
+                            self._fail(worker, AnalyzerError(f"Could not read analyzer result: {e}"))
+                else:
+                    self._wakeup.wait(timeout=0.1)
+                    self._wakeup.clear()
+
+                self._enforce_limits()
+            except Exception as e:
+                print(f"Error in analyzer supervisor: {e}")
+                time.sleep(0.1)
+
+    def _dispatch(self):
+        for worker in list(self._pool):
+            if worker.task is not None:
+                continue
+            with self._lock:
+                if not self._pending:
+                    return
+                task = self._pending.popleft()
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                worker.conn.send((task.func, task.args, task.kwargs))
+            except Exception as e:
+                task.future.set_exception(e)
+                continue
+            task.started_at = time.monotonic()
+            worker.task = task
+
+    def _collect(self, worker):
+        task = worker.task
+        try:
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            self._fail(worker, AnalyzerCrashed(f"Analyzer worker exited with code {worker.exit_code()}"))
+            return
+
+        worker.task = None
+        worker.tasks_done += 1
+        if status == "ok":
+            try:
+                task.future.set_result(_import_arrays(payload))
+            except Exception as e:
+                _discard_arrays(payload)
+                task.future.set_exception(e)
+        else:
+            remote_traceback = getattr(payload, "remote_traceback", None)
+            if remote_traceback:
+                print(f"Error in analyzer {getattr(task.func, '__name__', task.func)}:\n{remote_traceback}")
+            task.future.set_exception(payload)
+
+        if self.max_tasks_per_worker and worker.tasks_done >= self.max_tasks_per_worker:
+            worker.stop()
+            self._replace(worker)
+
+    def _enforce_limits(self):
+        now = time.monotonic()
+        for worker in list(self._pool):
+            task = worker.task
+            if task is None:
+                if not worker.process.is_alive():
+                    worker.kill()
+                    self._replace(worker)
+                continue
+
+            error = None
+            if now - task.started_at > task.timeout:
+                error = AnalyzerTimeout(f"Analyzer exceeded {task.timeout:.0f}s timeout")
+            elif not worker.process.is_alive():
+                error = AnalyzerCrashed(f"Analyzer worker exited with code {worker.exit_code()}")
+            elif self.max_rss_bytes:
+                rss = _rss_bytes(worker.process.pid)
+                if rss is not None and rss > self.max_rss_bytes:
+                    error = AnalyzerMemoryExceeded(
+                        f"Analyzer used {rss // (1024 * 1024)} MB, limit is {self.max_rss_bytes // (1024 * 1024)} MB"
+                    )
+
+            if error is not None:
+                self._fail(worker, error)
@@ -0,0 +1,206 @@
+"""
+Content-addressed storage for uploaded audio and derived artifacts.
+
+Each unique file is stored once under its SHA-256 digest. Cases reference
+blobs by path, so the reference count of a blob is the number of case rows
+pointing at it; a blob is removed only when the last reference goes away.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+try:
+    import soundfile
+except ImportError:  # FLAC encoding is skipped without soundfile
+    soundfile = None
+
+# ioctl request for a copy-on-write clone (btrfs, XFS with reflink, bcachefs)
+FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Clone src into dst sharing data blocks; False where unsupported"""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def link_or_copy(src: str, dst: str):
+    """Place src at dst without copying data where the filesystem allows it"""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    if not _reflink(src, dst):
+        shutil.copyfile(src, dst)
+
+
+# PCM subtypes FLAC stores bit for bit
+FLAC_SUBTYPES = ("PCM_16", "PCM_24")
+
+
+def encode_flac(src: str, dst: str) -> bool:
+    """Re-encode a 16- or 24-bit PCM file as FLAC at the same depth
+
+    Returns False, leaving the source to be kept as is, when soundfile is
+    unavailable or the source has another sample format (8/32-bit, float),
+    which FLAC could not hold without changing the samples.
+    """
+    if soundfile is None:
+        return False
+    subtype = soundfile.info(src).subtype
+    if subtype not in FLAC_SUBTYPES:
+        return False
+    data, sample_rate = soundfile.read(src, dtype="int32", always_2d=True)
+    soundfile.write(dst, data, sample_rate, format="FLAC", subtype=subtype)
+    return True
+
+
+class BlobStore:
+    """Stores files once per content hash under root/ab/abcdef...{ext}"""
+
+    def __init__(self, root: str, public_base: str = None):
+        self.root = root
+        self.public_base = public_base
+
+    def path_for(self, digest: str, ext: str = "") -> str:
+        """Storage path for a digest and extension"""
+        return os.path.join(self.root, digest[:2], f"{digest}{ext.lower()}")
+
+    def url_for(self, path: str) -> str:
+        """Public URL for a stored blob, when the store is served statically"""
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return f"{self.public_base.rstrip('/')}/{rel}"
+
+    def path_for_url(self, url: str) -> str:
+        """Storage path behind a public URL, or None if the URL is not served from this store"""
+        if not self.public_base or not url.startswith(self.public_base.rstrip('/') + '/'):
+            return None
+        return os.path.join(self.root, *url[len(self.public_base.rstrip('/')) + 1:].split('/'))
+
+    def contains(self, path: str) -> bool:
+        """Whether a path lives inside this store"""
+        root = os.path.abspath(self.root)
+        return os.path.commonpath([root, os.path.abspath(path)]) == root
+
+    def put_bytes(self, content: bytes, ext: str = "", digest: str = None) -> str:
+        """Store bytes unless identical content exists already; returns the blob path"""
+        digest = digest or hashlib.sha256(content).hexdigest()
+        path = self.path_for(digest, ext)
+        if os.path.exists(path):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def put_file(self, src: str, ext: str = None, move: bool = False) -> str:
+        """Store a file on disk by content hash; returns the blob path"""
+        digest = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        ext = os.path.splitext(src)[1] if ext is None else ext
+        path = self.path_for(digest.hexdigest(), ext)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            if move:
+                shutil.move(src, tmp_path)
+            else:
+                link_or_copy(src, tmp_path)
+            os.replace(tmp_path, path)
+        elif move:
+            os.remove(src)
+        return path
+
+    def put_pcm(self, src: str, move: bool = True) -> str:
+        """Store a PCM file (e.g. a WAV segment) as FLAC, keyed by the source content"""
+        digest = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+
+        path = self.path_for(digest, ".flac")
+        if os.path.exists(path):
+            if move:
+                os.remove(src)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}.flac"
+        try:
+            if encode_flac(src, tmp_path):
+                os.replace(tmp_path, path)
+                if move:
+                    os.remove(src)
+                return path
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        # No encoder available, or a sample format FLAC cannot hold: keep the original bytes
+        return self.put_file(src, move=move)
+
+    def release(self, path: str, in_use=None):
+        """Remove a blob that no longer has references
+
+        The blob is first moved aside and in_use() is checked again, so a case
+        that committed a reference to it in the meantime keeps it.
+        """
+        if not path or not self.contains(path):
+            return
+        doomed = f"{path}.release-{os.getpid()}"
+        try:
+            os.replace(path, doomed)
+        except OSError:
+            return
+        if in_use is not None and in_use():
+            os.replace(doomed, path)
+            return
+        os.remove(doomed)
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+
+def store_segment_files(store: BlobStore, paths: list) -> list:
+    """Move segment WAVs into a blob store as FLAC; returns their public URLs"""
+    return [store.url_for(store.put_pcm(path)) for path in paths]
+
+
+# Served under /static. API nodes and workers must see the same directory
+# (e.g. a shared volume) so segments written by a worker can be served.
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+
+# Where the diarizer writes segment WAVs before they are moved into the segment store
+SEGMENTS_DIR = os.path.join(STATIC_DIR, "segments")
+
+# Original uploads (private) and derived segment audio (served under /static)
+upload_store = BlobStore(os.getenv("UPLOAD_STORE_DIR", "uploads/blobs"))
+segment_store = BlobStore(os.path.join(STATIC_DIR, "blobs"), public_base="/static/blobs")
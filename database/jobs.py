@@ -0,0 +1,121 @@
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from .models import AnalysisJob
+from datetime import datetime, timedelta
+
+class AnalysisJobQueue:
+    """Durable analysis job queue stored in the application database.
+
+    On PostgreSQL workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+    so any number of workers on any number of nodes can poll concurrently.
+    A claimed job holds a lease; if its worker dies, the job becomes
+    claimable again once the lease expires.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.skip_locked = db.get_bind().dialect.name == "postgresql"
+
+    def enqueue(self, case_id: str, stages: list = None, options: dict = None, max_attempts: int = 3) -> AnalysisJob:
+        """Queue analysis of a case"""
+        job = AnalysisJob(case_id=case_id, stages=stages, options=options or {}, max_attempts=max_attempts)
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_job(self, job_id: str) -> AnalysisJob:
+        """Get job by ID"""
+        return self.db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+
+    def get_jobs_for_case(self, case_id: str) -> list[AnalysisJob]:
+        """Get a case's jobs, newest first"""
+        return self.db.query(AnalysisJob).filter(AnalysisJob.case_id == case_id) \
+            .order_by(AnalysisJob.created_at.desc()).all()
+
+    def claim(self, worker_id: str, lease_seconds: float = 300) -> AnalysisJob:
+        """Take the oldest runnable job, or None if the queue is empty"""
+        now = datetime.utcnow()
+        expired = and_(AnalysisJob.status == "running", AnalysisJob.locked_until < now)
+        exhausted = func.coalesce(AnalysisJob.attempts, 0) >= func.coalesce(AnalysisJob.max_attempts, 1)
+
+        # A job whose worker died or stalled on every attempt is not retried again
+        given_up = self.db.query(AnalysisJob).filter(expired, exhausted).update({
+            "status": "failed",
+            "locked_by": None,
+            "locked_until": None,
+            "finished_at": now,
+            "error": "Lease expired on the last attempt"
+        }, synchronize_session=False)
+        if given_up:
+            self.db.commit()
+
+        runnable = or_(
+            AnalysisJob.status == "queued",
+            and_(expired, ~exhausted)
+        )
+        query = self.db.query(AnalysisJob).filter(runnable).order_by(AnalysisJob.created_at)
+
+        if self.skip_locked:
+            job = query.with_for_update(skip_locked=True).first()
+            if job is None:
+                self.db.rollback()
+                return None
+        else:
+            # Without row locks, claim with a conditional update and retry on a lost race
+            for candidate in query.limit(5).all():
+                claimed = self.db.query(AnalysisJob).filter(
+                    AnalysisJob.id == candidate.id, runnable
+                ).update({"locked_by": worker_id}, synchronize_session=False)
+                if claimed:
+                    job = candidate
+                    break
+            else:
+                self.db.rollback()
+                return None
+
+        job.status = "running"
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=lease_seconds)
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = now
+        job.error = None
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def extend_lease(self, job_id: str, worker_id: str, lease_seconds: float = 300) -> bool:
+        """Keep a running job's lease alive; False if another worker has taken it over"""
+        updated = self.db.query(AnalysisJob).filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.locked_by == worker_id,
+            AnalysisJob.status == "running"
+        ).update({"locked_until": datetime.utcnow() + timedelta(seconds=lease_seconds)}, synchronize_session=False)
+        self.db.commit()
+        return bool(updated)
+
+    def complete(self, job_id: str):
+        """Mark a job as finished successfully"""
+        job = self.get_job(job_id)
+        if job:
+            job.status = "completed"
+            job.locked_by = None
+            job.locked_until = None
+            job.finished_at = datetime.utcnow()
+            self.db.commit()
+        return job
+
+    def fail(self, job_id: str, error: str):
+        """Record a failed attempt; the job is retried until max_attempts is reached"""
+        job = self.get_job(job_id)
+        if job:
+            job.error = error
+            job.locked_by = None
+            job.locked_until = None
+            if (job.attempts or 0) >= (job.max_attempts or 1):
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+            else:
+                job.status = "queued"
+            self.db.commit()
+        return job
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import uuid
@@ -13,9 +13,15 @@ class AudioForensicsCase(Base):
     case_name = Column(String, nullable=False)
     original_filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    file_hash = Column(String, nullable=True, index=True)  # SHA-256 of the uploaded file
+    audio_fingerprint = Column(LargeBinary, nullable=True)  # uint32 spectral sub-fingerprints
+    near_duplicates = Column(JSON, nullable=True)  # [{case_id, similarity, offset_seconds, ...}]
+    audio_duration = Column(Float, nullable=True)  # seconds
+    speech_intervals = Column(JSON, nullable=True)  # [[start, end], ...] voiced regions in seconds
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    deleted_at = Column(DateTime, nullable=True, index=True)  # set on delete; row and files are reaped later
     
     # Transcription data
     transcription_text = Column(Text, nullable=True)
@@ -42,11 +48,35 @@ class AudioForensicsCase(Base):
     # Diarization data
     estimated_speakers = Column(Integer, nullable=True)
     diarization_segments = Column(JSON, nullable=True)  # Array of segment objects with transcription, sentiment, gender
+    speaker_embeddings = Column(JSON, nullable=True)  # {speaker: [float, ...]} for cross-case voice matching
     
     # Analysis status flags
-    transcription_completed = Column(String, default="pending")  # pending, completed, failed
+    transcription_completed = Column(String, default="pending")  # pending, completed, failed, skipped
     sentiment_completed = Column(String, default="pending")
     gender_completed = Column(String, default="pending")
     metadata_completed = Column(String, default="pending")
     temporal_completed = Column(String, default="pending")
     diarization_completed = Column(String, default="pending")
+    
+    # Analyzer provenance per stage: {stage: {"version", "input_hash", "analyzed_at"}}
+    analysis_versions = Column(JSON, nullable=True)
+
+class AnalysisJob(Base):
+    __tablename__ = "audioforensics_analysis_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    case_id = Column(String, nullable=False, index=True)
+    stages = Column(JSON, nullable=True)  # stage names to run; null means all
+    options = Column(JSON, nullable=True)  # e.g. {"reuse_duplicates": true, "force": false}
+    
+    # Queue state
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    locked_by = Column(String, nullable=True)  # worker ID holding the lease
+    locked_until = Column(DateTime, nullable=True)  # lease expiry; expired running jobs are reclaimed
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
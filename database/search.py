@@ -0,0 +1,184 @@
+"""
+Full-text search over case and segment transcripts.
+
+PostgreSQL uses a side table with a generated tsvector column and a GIN
+index; SQLite uses an FTS5 virtual table. Each row is either a full-case
+transcript (segment_index NULL) or one diarization segment, carrying its
+speaker and time offsets so hits can be located in the recording.
+
+The ingest transcript has no timestamps, so full-case rows have no
+speaker or offsets; only segments with their own transcription can be
+located.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+INDEX_TABLE = "audioforensics_transcript_index"
+
+_POSTGRES_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (
+        id SERIAL PRIMARY KEY,
+        case_id VARCHAR NOT NULL REFERENCES audioforensics_cases(id) ON DELETE CASCADE,
+        segment_index INTEGER,
+        speaker VARCHAR,
+        start_time FLOAT,
+        end_time FLOAT,
+        text TEXT NOT NULL,
+        tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', text)) STORED
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS idx_transcript_index_tsv ON {INDEX_TABLE} USING GIN (tsv)",
+    f"CREATE INDEX IF NOT EXISTS idx_transcript_index_case_id ON {INDEX_TABLE} (case_id)",
+]
+
+_SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5(
+        text,
+        case_id UNINDEXED,
+        segment_index UNINDEXED,
+        speaker UNINDEXED,
+        start_time UNINDEXED,
+        end_time UNINDEXED,
+        tokenize = 'porter unicode61'
+    )
+    """,
+]
+
+# Rank and fetch first, then build highlights for the returned rows only
+_POSTGRES_SEARCH = f"""
+    SELECT hits.*, ts_headline('english', hits.text, websearch_to_tsquery('english', :query),
+                               'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5') AS highlight
+    FROM (
+        SELECT t.case_id, c.case_name, t.segment_index, t.speaker, t.start_time, t.end_time, t.text,
+               ts_rank_cd(t.tsv, websearch_to_tsquery('english', :query)) AS score
+        FROM {INDEX_TABLE} t
+        JOIN audioforensics_cases c ON c.id = t.case_id
+        WHERE t.tsv @@ websearch_to_tsquery('english', :query)
+          AND c.deleted_at IS NULL
+          AND (CAST(:case_id AS VARCHAR) IS NULL OR t.case_id = :case_id)
+        ORDER BY score DESC
+        LIMIT :limit
+    ) hits
+    ORDER BY hits.score DESC
+"""
+
+_SQLITE_SEARCH = f"""
+    SELECT t.case_id, c.case_name, t.segment_index, t.speaker, t.start_time, t.end_time,
+           -bm25({INDEX_TABLE}) AS score,
+           snippet({INDEX_TABLE}, 0, '<mark>', '</mark>', '…', 16) AS highlight
+    FROM {INDEX_TABLE} t
+    JOIN audioforensics_cases c ON c.id = t.case_id
+    WHERE {INDEX_TABLE} MATCH :query
+      AND c.deleted_at IS NULL
+      AND (:case_id IS NULL OR t.case_id = :case_id)
+    ORDER BY bm25({INDEX_TABLE})
+    LIMIT :limit
+"""
+
+
+def create_search_schema(engine):
+    """Create the transcript index for the engine's dialect"""
+    if engine.dialect.name == "postgresql":
+        statements = _POSTGRES_SCHEMA
+    elif engine.dialect.name == "sqlite":
+        statements = _SQLITE_SCHEMA
+    else:
+        return
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def drop_search_schema(engine):
+    """Drop the transcript index"""
+    if engine.dialect.name not in ("postgresql", "sqlite"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {INDEX_TABLE}"))
+
+
+def _fts5_query(query: str) -> str:
+    """Quote each term so user input cannot trip FTS5 query syntax"""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+class TranscriptSearchIndex:
+    """Keeps the transcript index in sync with cases and answers searches"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    @property
+    def supported(self) -> bool:
+        return self.dialect in ("postgresql", "sqlite")
+
+    def index_case(self, case):
+        """Replace the indexed transcripts of a case with its current ones"""
+        if not self.supported:
+            return
+        self.db.execute(text(f"DELETE FROM {INDEX_TABLE} WHERE case_id = :case_id"), {"case_id": case.id})
+
+        rows = []
+        if case.transcription_text:
+            rows.append({
+                "case_id": case.id, "segment_index": None, "speaker": None,
+                "start_time": None, "end_time": None, "text": case.transcription_text
+            })
+        for index, segment in enumerate(case.diarization_segments or []):
+            if segment.get('transcription'):
+                rows.append({
+                    "case_id": case.id, "segment_index": index, "speaker": segment.get('speaker'),
+                    "start_time": segment.get('start'), "end_time": segment.get('end'),
+                    "text": segment['transcription']
+                })
+        if rows:
+            self.db.execute(text(
+                f"INSERT INTO {INDEX_TABLE} (case_id, segment_index, speaker, start_time, end_time, text) "
+                "VALUES (:case_id, :segment_index, :speaker, :start_time, :end_time, :text)"
+            ), rows)
+        self.db.commit()
+
+    def rebuild(self) -> int:
+        """Index every case that has not been deleted; returns the number indexed"""
+        from .models import AudioForensicsCase
+
+        cases = self.db.query(AudioForensicsCase).filter(AudioForensicsCase.deleted_at.is_(None)).all()
+        for case in cases:
+            self.index_case(case)
+        return len(cases)
+
+    def remove_case(self, case_id: str):
+        """Drop a case from the index"""
+        if not self.supported:
+            return
+        self.db.execute(text(f"DELETE FROM {INDEX_TABLE} WHERE case_id = :case_id"), {"case_id": case_id})
+        self.db.commit()
+
+    def search(self, query: str, limit: int = 20, case_id: str = None) -> list[dict]:
+        """Ranked transcript hits with highlights, speaker and time offsets"""
+        if not self.supported or not query.strip():
+            return []
+        if self.dialect == "postgresql":
+            sql, match = _POSTGRES_SEARCH, query
+        else:
+            sql, match = _SQLITE_SEARCH, _fts5_query(query)
+
+        rows = self.db.execute(text(sql), {"query": match, "limit": limit, "case_id": case_id}).mappings()
+        return [
+            {
+                "case_id": row["case_id"],
+                "case_name": row["case_name"],
+                "segment_index": row["segment_index"],
+                "speaker": row["speaker"],
+                "start": row["start_time"],
+                "end": row["end_time"],
+                "score": float(row["score"]),
+                "highlight": row["highlight"],
+            }
+            for row in rows
+        ]
@@ -1,28 +1,28 @@
-from sqlalchemy.orm import Session
-from .models import AudioForensicsCase
+from sqlalchemy import String, cast
+from sqlalchemy.orm import Session, load_only
+from .models import AudioForensicsCase, AnalysisJob
+from .blob_store import BlobStore, SEGMENTS_DIR, upload_store, segment_store
+from .search import TranscriptSearchIndex
 from datetime import datetime
+import hashlib
 import os
 import uuid
 
 class AudioForensicsService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, uploads: BlobStore = upload_store, segments: BlobStore = segment_store):
         self.db = db
+        self.uploads = uploads
+        self.segments = segments
     
     def create_case(self, name: str, original_filename: str, file_content: bytes, notes: str = None) -> AudioForensicsCase:
-        """Create a new case and save the audio file"""
+        """Create a new case and store the audio file (once per unique content)"""
         # Generate unique case ID
         case_id = str(uuid.uuid4())
         
-        # Create uploads directory if it doesn't exist
-        uploads_dir = "uploads/cases"
-        os.makedirs(uploads_dir, exist_ok=True)
-        
-        # Save file with case ID
+        # Identical evidence files share one blob
+        file_hash = hashlib.sha256(file_content).hexdigest()
         file_extension = os.path.splitext(original_filename)[1]
-        file_path = os.path.join(uploads_dir, f"{case_id}{file_extension}")
-        
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        file_path = self.uploads.put_bytes(file_content, file_extension, digest=file_hash)
         
         # Create case record
         case = AudioForensicsCase(
@@ -30,6 +30,7 @@ class AudioForensicsService:
             case_name=name,
             original_filename=original_filename,
             file_path=file_path,
+            file_hash=file_hash,
             notes=notes
         )
         
@@ -37,31 +38,249 @@ class AudioForensicsService:
         self.db.commit()
         self.db.refresh(case)
         
+        # A purge that found no reference before this commit may have released the blob
+        if not os.path.exists(file_path):
+            self.uploads.put_bytes(file_content, file_extension, digest=file_hash)
+        
         return case
     
-    def get_case(self, case_id: str) -> AudioForensicsCase:
-        """Get case by ID"""
-        return self.db.query(AudioForensicsCase).filter(AudioForensicsCase.id == case_id).first()
+    def _live_cases(self):
+        """Query over cases that have not been deleted"""
+        return self.db.query(AudioForensicsCase).filter(AudioForensicsCase.deleted_at.is_(None))
+    
+    def get_case(self, case_id: str, columns: list[str] = None) -> AudioForensicsCase:
+        """Get case by ID, optionally loading only the named columns"""
+        query = self._live_cases().filter(AudioForensicsCase.id == case_id)
+        if columns:
+            query = query.options(load_only(*(getattr(AudioForensicsCase, column) for column in columns)))
+        return query.first()
     
     def get_all_cases(self) -> list[AudioForensicsCase]:
         """Get all cases"""
-        return self.db.query(AudioForensicsCase).order_by(AudioForensicsCase.created_at.desc()).all()
+        return self._live_cases().order_by(AudioForensicsCase.created_at.desc()).all()
+    
+    def get_case_names(self, case_ids: list[str]) -> dict:
+        """Map case IDs to case names for live cases"""
+        if not case_ids:
+            return {}
+        rows = self.db.query(AudioForensicsCase.id, AudioForensicsCase.case_name).filter(
+            AudioForensicsCase.id.in_(case_ids),
+            AudioForensicsCase.deleted_at.is_(None)
+        )
+        return {row.id: row.case_name for row in rows}
+    
+    def get_case_ids(self, case_ids: list[str] = None, created_after: datetime = None,
+                     created_before: datetime = None) -> list[str]:
+        """Get IDs of cases matching an optional filter, oldest first"""
+        query = self.db.query(AudioForensicsCase.id).filter(AudioForensicsCase.deleted_at.is_(None))
+        if case_ids:
+            query = query.filter(AudioForensicsCase.id.in_(case_ids))
+        if created_after:
+            query = query.filter(AudioForensicsCase.created_at >= created_after)
+        if created_before:
+            query = query.filter(AudioForensicsCase.created_at < created_before)
+        return [row.id for row in query.order_by(AudioForensicsCase.created_at).all()]
     
     def delete_case(self, case_id: str) -> bool:
-        """Delete case and associated file"""
+        """Mark a case as deleted; its row and files are removed later by purge_case"""
         case = self.get_case(case_id)
         if not case:
             return False
         
-        # Delete file
-        if os.path.exists(case.file_path):
-            os.remove(case.file_path)
+        case.deleted_at = datetime.utcnow()
+        self.db.commit()
+        return True
+    
+    def get_deleted_case_ids(self, limit: int = 50) -> list[str]:
+        """Get IDs of cases marked as deleted and not yet purged, oldest first"""
+        rows = self.db.query(AudioForensicsCase.id).filter(
+            AudioForensicsCase.deleted_at.isnot(None)
+        ).order_by(AudioForensicsCase.deleted_at).limit(limit).all()
+        return [row.id for row in rows]
+    
+    def purge_case(self, case_id: str) -> bool:
+        """Remove a deleted case's row and any stored files no other case references"""
+        case = self.db.query(AudioForensicsCase).filter(
+            AudioForensicsCase.id == case_id,
+            AudioForensicsCase.deleted_at.isnot(None)
+        ).first()
+        if not case:
+            return False
+        
+        file_path = case.file_path
+        segment_urls = [s.get('file_url') for s in (case.diarization_segments or []) if s.get('file_url')]
         
-        # Delete case
+        # Delete the row first; files left behind by a crash are found by the orphan sweep
         self.db.delete(case)
+        self.db.query(AnalysisJob).filter(AnalysisJob.case_id == case_id).delete(synchronize_session=False)
         self.db.commit()
+        TranscriptSearchIndex(self.db).remove_case(case_id)
+        
+        if not self._file_path_in_use(file_path):
+            if self.uploads.contains(file_path):
+                self.uploads.release(file_path, in_use=lambda: self._file_path_in_use(file_path))
+            elif os.path.exists(file_path):
+                os.remove(file_path)
+        for url in segment_urls:
+            if self._segment_url_in_use(url):
+                continue
+            path = self.segments.path_for_url(url)
+            if path:
+                self.segments.release(path, in_use=lambda url=url: self._segment_url_in_use(url))
+            else:
+                legacy_path = self._legacy_segment_path(url)
+                if legacy_path and os.path.exists(legacy_path):
+                    os.remove(legacy_path)
         return True
     
+    def get_referenced_files(self) -> tuple[set, set]:
+        """Stored upload paths and segment URLs referenced by any case row, deleted or not"""
+        file_paths, segment_urls = set(), set()
+        for file_path, segments in self.db.query(AudioForensicsCase.file_path, AudioForensicsCase.diarization_segments):
+            file_paths.add(os.path.normpath(file_path))
+            segment_urls.update(s.get('file_url') for s in (segments or []) if s.get('file_url'))
+        return file_paths, segment_urls
+    
+    @staticmethod
+    def _legacy_segment_path(url: str) -> str:
+        """Local path of a segment written directly to the segments directory"""
+        if url.startswith("/static/segments/"):
+            return os.path.join(SEGMENTS_DIR, os.path.basename(url))
+        return None
+    
+    def _file_path_in_use(self, file_path: str) -> bool:
+        """Whether any case still references a stored audio file"""
+        return self.db.query(AudioForensicsCase.id).filter(AudioForensicsCase.file_path == file_path).first() is not None
+    
+    def _segment_url_in_use(self, url: str) -> bool:
+        """Whether any case's diarization segments still reference a segment blob"""
+        return self.db.query(AudioForensicsCase.id).filter(
+            cast(AudioForensicsCase.diarization_segments, String).contains(url)
+        ).first() is not None
+    
+    def set_file_hash(self, case_id: str, file_hash: str):
+        """Store the content hash of the case's audio file"""
+        case = self.get_case(case_id)
+        if case:
+            case.file_hash = file_hash
+            self.db.commit()
+            self.db.refresh(case)
+        return case
+    
+    def record_analysis_version(self, case_id: str, stage: str, version: str, input_hash: str,
+                                reused_from: str = None):
+        """Record which analyzer version and input produced a stage's stored result"""
+        case = self.get_case(case_id)
+        if case:
+            versions = dict(case.analysis_versions or {})
+            versions[stage] = {
+                "version": version,
+                "input_hash": input_hash,
+                "analyzed_at": datetime.utcnow().isoformat()
+            }
+            if reused_from:
+                versions[stage]["reused_from"] = reused_from
+            case.analysis_versions = versions
+            self.db.commit()
+            self.db.refresh(case)
+        return case
+    
+    def update_fingerprint(self, case_id: str, fingerprint: bytes, near_duplicates: list):
+        """Store the audio fingerprint and any near-duplicate cases found for it"""
+        case = self.get_case(case_id)
+        if case:
+            case.audio_fingerprint = fingerprint
+            case.near_duplicates = near_duplicates
+            self.db.commit()
+            self.db.refresh(case)
+        return case
+    
+    def update_speech_intervals(self, case_id: str, intervals: list, duration: float):
+        """Store the voiced regions found by voice activity detection"""
+        case = self.get_case(case_id)
+        if case:
+            case.speech_intervals = intervals
+            case.audio_duration = duration
+            self.db.commit()
+            self.db.refresh(case)
+        return case
+    
+    def copy_analyses(self, case_id: str, source_id: str, stages: list, offset_seconds: float = 0.0,
+                      duration: float = None) -> list:
+        """Copy completed speech analyses from a near-duplicate case; returns the stages copied
+
+        offset_seconds maps times in this case to the source (source = this + offset);
+        diarization segments are shifted back and clipped to this case's duration.
+        """
+        case = self.get_case(case_id)
+        source = self.get_case(source_id)
+        if not case or not source:
+            return []
+        
+        copied = []
+        if "transcription" in stages and source.transcription_completed == "completed":
+            case.transcription_text = source.transcription_text
+            case.transcription_confidence = source.transcription_confidence
+            case.transcription_language = source.transcription_language
+            case.transcription_completed = "completed"
+            copied.append("transcription")
+        if "sentiment" in stages and source.sentiment_completed == "completed" \
+                and ("transcription" in copied or "transcription" not in stages):
+            case.sentiment_result = source.sentiment_result
+            case.sentiment_confidence = source.sentiment_confidence
+            case.sentiment_completed = "completed"
+            copied.append("sentiment")
+        if "gender" in stages and source.gender_completed == "completed":
+            case.gender_result = source.gender_result
+            case.gender_confidence = source.gender_confidence
+            case.gender_completed = "completed"
+            copied.append("gender")
+        if "diarization" in stages and source.diarization_completed == "completed":
+            segments = []
+            for segment in source.diarization_segments or []:
+                start = float(segment['start']) - offset_seconds
+                end = float(segment['end']) - offset_seconds
+                if end <= 0 or (duration is not None and start >= duration):
+                    continue
+                shifted = dict(segment)
+                shifted['start'] = max(0.0, start)
+                shifted['end'] = min(end, duration) if duration is not None else end
+                segments.append(shifted)
+            speakers = {segment['speaker'] for segment in segments}
+            case.diarization_segments = segments
+            case.estimated_speakers = len(speakers)
+            case.speaker_embeddings = {
+                speaker: vector for speaker, vector in (source.speaker_embeddings or {}).items() if speaker in speakers
+            } or None
+            case.diarization_completed = "completed"
+            copied.append("diarization")
+        
+        self.db.commit()
+        self.db.refresh(case)
+        if "transcription" in copied or "diarization" in copied:
+            self._reindex_transcripts(case)
+        return copied
+    
+    def mark_stage_failed(self, case_id: str, stage: str):
+        """Set a stage's status flag to failed"""
+        case = self.get_case(case_id)
+        if case:
+            setattr(case, f"{stage}_completed", "failed")
+            self.db.commit()
+            self.db.refresh(case)
+        return case
+    
+    def mark_stages(self, case_id: str, stages: list, status: str, only: tuple):
+        """Set the status flag of the given stages whose status is one of only"""
+        case = self.get_case(case_id)
+        if case:
+            for stage in stages:
+                if getattr(case, f"{stage}_completed") in only:
+                    setattr(case, f"{stage}_completed", status)
+            self.db.commit()
+            self.db.refresh(case)
+        return case
+    
     def update_transcription(self, case_id: str, text: str, confidence: float = None, language: str = None):
         """Update transcription results"""
         case = self.get_case(case_id)
@@ -72,6 +291,7 @@ class AudioForensicsService:
             case.transcription_completed = "completed"
             self.db.commit()
             self.db.refresh(case)
+            self._reindex_transcripts(case)
         return case
     
     def update_sentiment(self, case_id: str, sentiment: str, confidence: float = None):
@@ -119,15 +339,18 @@ class AudioForensicsService:
             self.db.refresh(case)
         return case
     
-    def update_diarization(self, case_id: str, estimated_speakers: int, segments: list):
-        """Update diarization results with segments"""
+    def update_diarization(self, case_id: str, estimated_speakers: int, segments: list,
+                           speaker_embeddings: dict = None):
+        """Update diarization results with segments and per-speaker embeddings"""
         case = self.get_case(case_id)
         if case:
             case.estimated_speakers = estimated_speakers
             case.diarization_segments = segments
+            case.speaker_embeddings = speaker_embeddings
             case.diarization_completed = "completed"
             self.db.commit()
             self.db.refresh(case)
+            self._reindex_transcripts(case)
         return case
     
     def update_segment_analysis(self, case_id: str, segment_index: int, transcription: str = None, 
@@ -135,7 +358,8 @@ class AudioForensicsService:
         """Update individual segment analysis results"""
         case = self.get_case(case_id)
         if case and case.diarization_segments:
-            segments = case.diarization_segments.copy()
+            # Copy each segment so the JSON column is seen as changed
+            segments = [dict(segment) for segment in case.diarization_segments]
             if segment_index < len(segments):
                 if transcription is not None:
                     segments[segment_index]['transcription'] = transcription
@@ -147,4 +371,18 @@ class AudioForensicsService:
                 case.diarization_segments = segments
                 self.db.commit()
                 self.db.refresh(case)
+                if transcription is not None:
+                    self._reindex_transcripts(case)
         return case
+    
+    def search_transcripts(self, query: str, limit: int = 20, case_id: str = None) -> list[dict]:
+        """Ranked keyword hits across case and segment transcripts"""
+        return TranscriptSearchIndex(self.db).search(query, limit=limit, case_id=case_id)
+    
+    def _reindex_transcripts(self, case: AudioForensicsCase):
+        """Refresh the search index for a case; analysis results are kept even if this fails"""
+        try:
+            TranscriptSearchIndex(self.db).index_case(case)
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error indexing transcripts for case {case.id}: {e}")
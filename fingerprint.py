@@ -0,0 +1,217 @@
+"""
+Spectral fingerprints for spotting re-encoded copies of known evidence.
+
+Each frame of audio becomes a 32-bit sub-fingerprint: the signs of energy
+differences between adjacent frequency bands, compared with the previous
+frame. These bits survive re-encoding (mp3, m4a, resampling), so two
+exports of the same recording share most sub-fingerprints at a fixed time
+offset. FingerprintIndex finds candidate cases by exact sub-fingerprint
+hits and confirms them by bit error rate over the aligned overlap.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from database.models import AudioForensicsCase
+
+FINGERPRINT_SAMPLE_RATE = 5512
+FINGERPRINT_N_FFT = 2048
+FINGERPRINT_HOP = 256
+FRAME_SECONDS = FINGERPRINT_HOP / FINGERPRINT_SAMPLE_RATE
+
+# 33 log-spaced bands between 300 Hz and 2 kHz give 32 difference bits
+_BAND_EDGES = np.geomspace(300, 2000, 34)
+
+
+def compute_fingerprint(audio_path: str) -> bytes:
+    """Sub-fingerprints of a file as little-endian uint32 bytes"""
+    import librosa
+
+    audio, _ = librosa.load(audio_path, sr=FINGERPRINT_SAMPLE_RATE, mono=True)
+    if len(audio) < FINGERPRINT_N_FFT:
+        return b""
+    power = np.abs(librosa.stft(audio, n_fft=FINGERPRINT_N_FFT, hop_length=FINGERPRINT_HOP)) ** 2
+    freqs = librosa.fft_frequencies(sr=FINGERPRINT_SAMPLE_RATE, n_fft=FINGERPRINT_N_FFT)
+
+    band_of_bin = np.digitize(freqs, _BAND_EDGES) - 1
+    valid = (band_of_bin >= 0) & (band_of_bin < 33)
+    bands = np.zeros((33, power.shape[1]), dtype=np.float64)
+    np.add.at(bands, band_of_bin[valid], power[valid])
+
+    band_diff = bands[:-1] - bands[1:]                  # (32, frames)
+    bits = (band_diff[:, 1:] - band_diff[:, :-1]) > 0   # (32, frames - 1)
+    weights = (1 << np.arange(32, dtype=np.uint64)).astype(np.uint64)
+    codes = (bits.T.astype(np.uint64) * weights).sum(axis=1).astype("<u4")
+    return codes.tobytes()
+
+
+def fingerprint_duration(fingerprint: bytes) -> float:
+    """Approximate length in seconds of the audio behind a fingerprint"""
+    return len(fingerprint or b"") // 4 * FRAME_SECONDS
+
+
+def _as_codes(fingerprint: bytes) -> np.ndarray:
+    return np.frombuffer(fingerprint or b"", dtype="<u4")
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Number of set bits in each uint32"""
+    return np.unpackbits(values.astype("<u4").view(np.uint8).reshape(-1, 4), axis=1).sum(axis=1)
+
+
+def bit_error_rate(a: np.ndarray, b: np.ndarray, offset: int) -> tuple[float, int]:
+    """BER of a against b where a[i] aligns with b[i + offset]; returns (ber, overlapping frames)"""
+    start = max(0, -offset)
+    end = min(len(a), len(b) - offset)
+    if end <= start:
+        return 1.0, 0
+    diff = np.bitwise_xor(a[start:end], b[start + offset:end + offset])
+    return float(_popcount(diff).sum()) / (32 * (end - start)), end - start
+
+
+class FingerprintIndex:
+    """Inverted index of sampled sub-fingerprints over all live cases"""
+
+    def __init__(self, stride: int = 4, max_ber: float = 0.35, min_overlap: float = 0.5,
+                 refresh_interval: float = 5.0):
+        # Only every stride-th frame of stored cases is indexed; queries probe every frame
+        self.stride = stride
+        self.max_ber = max_ber
+        self.min_overlap = min_overlap
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._case_ids = []           # case number -> case_id
+        self._case_numbers = {}       # case_id -> case number
+        self._removed = set()         # case numbers no longer live
+        self._chunks = []             # (codes, case numbers, frames) not yet merged
+        self._codes = np.zeros(0, dtype="<u4")
+        self._owners = np.zeros(0, dtype=np.int32)
+        self._frames = np.zeros(0, dtype=np.int32)
+        self._watermark = None
+        self._last_refresh = 0.0
+
+    def add_case(self, case_id: str, fingerprint: bytes):
+        """Index (or re-index) a case's fingerprint"""
+        codes = _as_codes(fingerprint)
+        with self._lock:
+            self.remove_case(case_id)
+            if not len(codes):
+                return
+            number = len(self._case_ids)
+            self._case_ids.append(case_id)
+            self._case_numbers[case_id] = number
+            frames = np.arange(0, len(codes), self.stride, dtype=np.int32)
+            # All-zero codes come from silence and would match everything
+            frames = frames[codes[frames] != 0]
+            self._chunks.append((codes[frames], np.full(len(frames), number, dtype=np.int32), frames))
+
+    def remove_case(self, case_id: str):
+        with self._lock:
+            number = self._case_numbers.pop(case_id, None)
+            if number is not None:
+                self._removed.add(number)
+
+    def _merge(self):
+        if not self._chunks and not self._removed:
+            return
+        codes = np.concatenate([self._codes] + [c[0] for c in self._chunks])
+        owners = np.concatenate([self._owners] + [c[1] for c in self._chunks])
+        frames = np.concatenate([self._frames] + [c[2] for c in self._chunks])
+        if self._removed:
+            keep = ~np.isin(owners, np.fromiter(self._removed, dtype=np.int32))
+            codes, owners, frames = codes[keep], owners[keep], frames[keep]
+            self._removed.clear()
+        order = np.argsort(codes, kind="stable")
+        self._codes, self._owners, self._frames = codes[order], owners[order], frames[order]
+        self._chunks = []
+
+    def candidates(self, fingerprint: bytes, limit: int = 5, exclude_case: str = None) -> list:
+        """(case_id, frame offset, hits) of cases sharing the most aligned sub-fingerprints"""
+        query = _as_codes(fingerprint)
+        with self._lock:
+            self._merge()
+            if not len(query) or not len(self._codes):
+                return []
+            left = np.searchsorted(self._codes, query, side="left")
+            right = np.searchsorted(self._codes, query, side="right")
+            hit_counts = np.where(query != 0, right - left, 0)
+            total = int(hit_counts.sum())
+            if not total:
+                return []
+            query_frames = np.repeat(np.arange(len(query), dtype=np.int64), hit_counts)
+            # Expand each [left, right) posting range without a Python loop
+            run_starts = np.repeat(np.cumsum(hit_counts) - hit_counts, hit_counts)
+            positions = np.repeat(left, hit_counts) + (np.arange(total) - run_starts)
+            owners = self._owners[positions].astype(np.int64)
+            offsets = self._frames[positions].astype(np.int64) - query_frames
+
+            # Vote for (case, offset) pairs; a true copy piles up at one offset
+            keys = owners * (1 << 32) + (offsets + (1 << 31))
+            unique, counts = np.unique(keys, return_counts=True)
+            # A single hit at an offset is chance; real copies produce many
+            repeated = counts >= 2
+            unique, counts = unique[repeated], counts[repeated]
+            results, seen = [], set()
+            for i in np.argsort(-counts):
+                number = int(unique[i] >> 32)
+                case_id = self._case_ids[number]
+                if case_id in seen or case_id == exclude_case or self._case_numbers.get(case_id) != number:
+                    continue
+                seen.add(case_id)
+                results.append((case_id, int((unique[i] & 0xFFFFFFFF) - (1 << 31)), int(counts[i])))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def find_near_duplicates(self, db, case_id: str, fingerprint: bytes, limit: int = 5) -> list[dict]:
+        """Cases whose audio matches this fingerprint once aligned, best first"""
+        query = _as_codes(fingerprint)
+        matches = []
+        for other_id, offset, hits in self.candidates(fingerprint, limit=limit, exclude_case=case_id):
+            row = db.query(AudioForensicsCase.audio_fingerprint).filter(
+                AudioForensicsCase.id == other_id,
+                AudioForensicsCase.deleted_at.is_(None)
+            ).first()
+            if not row or not row.audio_fingerprint:
+                continue
+            other = _as_codes(row.audio_fingerprint)
+            ber, overlap = bit_error_rate(query, other, offset)
+            if overlap < self.min_overlap * min(len(query), len(other)) or ber > self.max_ber:
+                continue
+            matches.append({
+                "case_id": other_id,
+                "similarity": round(1.0 - ber, 4),
+                # Seconds to add to a time in this recording to get the same moment in the other
+                "offset_seconds": round(offset * FRAME_SECONDS, 3),
+                "overlap_seconds": round(overlap * FRAME_SECONDS, 3),
+                # Share of the longer recording covered by the overlap
+                "coverage": round(overlap / max(len(query), len(other)), 4),
+            })
+        return sorted(matches, key=lambda m: -m["similarity"])
+
+    def refresh(self, db, force: bool = False):
+        """Pick up cases changed since the last refresh (at most every refresh_interval)"""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        query = db.query(
+            AudioForensicsCase.id,
+            AudioForensicsCase.audio_fingerprint,
+            AudioForensicsCase.deleted_at,
+            AudioForensicsCase.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(AudioForensicsCase.updated_at >= self._watermark)
+        watermark = self._watermark
+        for case_id, fingerprint, deleted_at, updated_at in query:
+            if deleted_at is not None or not fingerprint:
+                self.remove_case(case_id)
+            elif case_id not in self._case_numbers:
+                # A case's audio never changes, so its fingerprint is indexed once
+                self.add_case(case_id, fingerprint)
+            if updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        self._watermark = watermark or datetime.utcnow()
+        self._last_refresh = time.monotonic()
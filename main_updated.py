@@ -1,6 +1,7 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 import tempfile
 from transcribe import transcribe_audio
 from sentiment_analysis import get_sentiment
@@ -14,20 +15,91 @@ import os
 from pathlib import Path
 from metadata import extract_audio_metadata
 import io
+import json
+import time
 import base64
 import matplotlib.pyplot as plt
 from datetime import datetime
 
 # Database imports
-from database.connection import get_db, create_tables
+from database.connection import get_db, create_tables, SessionLocal
 from database.services import AudioForensicsService
+from database.jobs import AnalysisJobQueue
+from analysis_pool import AnalyzerPool
+from analysis_pipeline import AnalysisPipeline, STAGES
+from progress import broker_from_env
+from speaker_index import SpeakerIndex
+from responses import encode_response, to_columns
+from fingerprint import FingerprintIndex
+from reaper import CaseReaper, TEMP_PREFIX
+from database.blob_store import STATIC_DIR, SEGMENTS_DIR
+from admission import (
+    AdmissionController, COST_WEIGHTS, PRIORITY_BULK, PRIORITY_INTERACTIVE, client_key, estimate_duration
+)
 
 app = FastAPI()
 
+# CPU-bound analyzers run in supervised worker processes, not in the API worker
+analyzer_pool = AnalyzerPool.from_env()
+
+# Stage progress events for /cases/{case_id}/events
+progress_broker = broker_from_env()
+
+# Per-speaker embeddings of all cases for cross-case voice matching
+speaker_index = SpeakerIndex()
+
+# Spectral fingerprints of all cases for the near-duplicate precheck
+fingerprint_index = FingerprintIndex()
+
+# "inline" analyzes uploads in this process; "queue" hands them to worker.py
+# processes through the job table, so API nodes only store and serve cases
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "inline")
+
+# Longest a progress event stream stays open; clients reconnect for a fresh snapshot
+PROGRESS_STREAM_MAX_SECONDS = float(os.getenv("PROGRESS_STREAM_MAX_SECONDS", "3600"))
+
+# Prices analysis requests by audio length and admits them within capacity and per-client quotas
+admission_controller = AdmissionController.from_env()
+
+def admit_upload(analysis: str, priority: int = PRIORITY_BULK):
+    """Dependency that holds admission for an uploaded file while the endpoint runs"""
+    async def dependency(request: Request, file: UploadFile = File(...)):
+        header = await file.read(65536)
+        await file.seek(0)
+        cost = estimate_duration(header, file.size or len(header), file.filename) * COST_WEIGHTS[analysis]
+        ticket = await admission_controller.acquire(client_key(request), cost, priority)
+        try:
+            yield
+        finally:
+            admission_controller.release(ticket)
+    return dependency
+
+# Deleted cases and orphaned files are cleaned up in the background
+case_reaper = CaseReaper.from_env()
+background_tasks = set()
+
 # Create database tables on startup
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    analyzer_pool.start()
+    db = SessionLocal()
+    try:
+        speaker_index.refresh(db, force=True)
+        fingerprint_index.refresh(db, force=True)
+    finally:
+        db.close()
+    background_tasks.add(asyncio.create_task(case_reaper.run_forever(
+        reap_interval=float(os.getenv("REAPER_INTERVAL", "30")),
+        gc_interval=float(os.getenv("REAPER_GC_INTERVAL", "3600"))
+    )))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    analyzer_pool.shutdown()
+    await progress_broker.close()
 
 # Allow CORS for React frontend
 app.add_middleware(
@@ -39,18 +111,29 @@ app.add_middleware(
 )
 
 # Mount static files for diarization segments
-os.makedirs("static/segments", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+os.makedirs(SEGMENTS_DIR, exist_ok=True)
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 # Case Management Endpoints
 @app.post("/cases/")
 async def create_case(
+    request: Request,
     file: UploadFile = File(...),
     name: str = Form(...),
     notes: str = Form(None),
+    wait: bool = Form(True),
+    reuse_duplicates: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """Create a new case and perform all analyses"""
+    """Create a new case and perform all analyses
+
+    With wait=false the case is returned as soon as it is stored and the
+    analyses continue in the background; follow them on /cases/{id}/events.
+    With reuse_duplicates=true, speech analyses of a near-duplicate case
+    (e.g. the same call exported in another format) are reused instead of rerun.
+    With ANALYSIS_MODE=queue the analyses are always queued for a worker and
+    the response carries the job ID.
+    """
     try:
         if not file.filename.endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
@@ -58,102 +141,157 @@ async def create_case(
         # Read file content
         file_content = await file.read()
         
-        # Create case in database
-        service = AudioForensicsService(db)
-        case = service.create_case(name, file.filename, file_content, notes)
+        # Price the analyses before storing anything, so a rejected upload leaves no case behind
+        cost = estimate_duration(file_content[:65536], len(file_content), file.filename) * COST_WEIGHTS["case"]
+        client = client_key(request)
+        ticket = None
+        if ANALYSIS_MODE == "queue":
+            # Workers pace themselves; only the client's quota applies here
+            admission_controller.charge(client, cost)
+        else:
+            ticket = await admission_controller.acquire(client, cost, PRIORITY_BULK)
         
-        # Save file temporarily for analysis
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp:
-            tmp.write(file_content)
-            temp_path = tmp.name
-
         try:
-            # 1. Transcription
-            transcription_text = transcribe_audio(file_content, file.filename)
-            service.update_transcription(case.id, transcription_text)
-            
-            # 2. Sentiment Analysis
-            sentiment_result = get_sentiment(transcription_text)
-            service.update_sentiment(case.id, sentiment_result)
-            
-            # 3. Gender Detection
-            gender_result = process_audio(temp_path)
-            if isinstance(gender_result, dict):
-                gender = gender_result.get("gender", str(gender_result))
-            else:
-                gender = str(gender_result)
-            service.update_gender_detection(case.id, gender)
-            
-            # 4. Metadata Analysis
-            metadata_result = extract_audio_metadata(
-                filepath=temp_path,
-                original_filename=file.filename
-            )
-            if metadata_result["success"]:
-                service.update_metadata(case.id, metadata_result["metadata"])
-            
-            # 5. Temporal Inconsistency Analysis (no graph)
-            bg_res, phase_res, high_confidence_splices = analyze_audio_splices(temp_path)
-            
-            background_splices = [
-                {"time": float(time), "confidence": float(conf)}
-                for time, conf in zip(bg_res['times'], bg_res.get('confidence', []))
-            ]
-            
-            phase_splices = [
-                {"time": float(time), "confidence": float(conf)}
-                for time, conf in zip(phase_res['times'], phase_res.get('confidence', []))
-            ]
-            
-            combined_splices = [
-                {"time": float(splice['time']), 
-                 "confidence": float(splice['confidence']), 
-                 "methods": splice['methods']}
-                for splice in high_confidence_splices
-            ]
-            
-            service.update_temporal_analysis(case.id, background_splices, phase_splices, combined_splices)
-            
-            # 6. Diarization
-            diarization_results = run_diarization(
-                temp_path,
-                segments_dir="static/segments",
-                public_base="/static/segments"
+            # Create case in database
+            service = AudioForensicsService(db)
+            case = service.create_case(name, file.filename, file_content, notes)
+        except Exception:
+            admission_controller.release(ticket)
+            raise
+        
+        if ANALYSIS_MODE == "queue":
+            job = AnalysisJobQueue(db).enqueue(
+                case.id, options={"check_duplicates": True, "reuse_duplicates": reuse_duplicates}
             )
-            
-            segments_data = []
-            for segment in diarization_results.get('segments', []):
-                segments_data.append({
-                    'speaker': segment['speaker'],
-                    'start': segment['start'],
-                    'end': segment['end'],
-                    'file_url': segment['file_url'],
-                    'transcription': None,  # Will be filled by segment analysis
-                    'sentiment': None,      # Will be filled by segment analysis
-                    'gender': None          # Will be filled by segment analysis
-                })
-            
-            service.update_diarization(
-                case.id, 
-                diarization_results.get('estimated_speakers', 0), 
-                segments_data
+            return {
+                "id": case.id,
+                "name": case.case_name,
+                "created_at": case.created_at.isoformat(),
+                "job_id": job.id,
+                "events_url": f"/cases/{case.id}/events",
+                "message": "Case created successfully; analyses are queued"
+            }
+        
+        if not wait:
+            task = asyncio.create_task(analyze_case_in_background(case.id, file_content, reuse_duplicates, ticket))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+            return {
+                "id": case.id,
+                "name": case.case_name,
+                "created_at": case.created_at.isoformat(),
+                "events_url": f"/cases/{case.id}/events",
+                "message": "Case created successfully; analyses are running"
+            }
+        
+        # Analyze the stored blob directly; no temporary copy is needed
+        try:
+            pipeline = AnalysisPipeline(service, analyzer_pool, events=progress_broker, fingerprints=fingerprint_index,
+                                        speakers=speaker_index)
+            analyzed = await pipeline.run(
+                case, case.file_path, file_content=file_content,
+                check_duplicates=True, reuse_duplicates=reuse_duplicates
             )
-            
         finally:
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            admission_controller.release(ticket)
 
         return {
             "id": case.id,
             "name": case.case_name,
             "created_at": case.created_at.isoformat(),
+            "near_duplicates": (analyzed.near_duplicates if analyzed else None) or [],
             "message": "Case created successfully with all analyses completed"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def analyze_case_in_background(case_id: str, file_content: bytes, reuse_duplicates: bool = False,
+                                     ticket=None):
+    """Run all analyses for a stored case with a session of its own, then release its admission"""
+    db = SessionLocal()
+    try:
+        service = AudioForensicsService(db)
+        case = service.get_case(case_id)
+        if case:
+            pipeline = AnalysisPipeline(service, analyzer_pool, events=progress_broker, fingerprints=fingerprint_index,
+                                        speakers=speaker_index)
+            await pipeline.run(
+                case, case.file_path, file_content=file_content,
+                check_duplicates=True, reuse_duplicates=reuse_duplicates
+            )
+    except Exception as e:
+        print(f"Error analyzing case {case_id}: {e}")
+    finally:
+        admission_controller.release(ticket)
+        db.close()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Status of a queued analysis job"""
+    job = AnalysisJobQueue(db).get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "id": job.id,
+        "case_id": job.case_id,
+        "stages": job.stages,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "worker": job.locked_by,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+@app.get("/cases/{case_id}/events")
+async def case_events(case_id: str, request: Request, db: Session = Depends(get_db)):
+    """Server-sent events with stage progress and partial results for a case"""
+    service = AudioForensicsService(db)
+    case = service.get_case(case_id)
+    
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    def sse(event: dict) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    
+    async def stream():
+        # Subscribe before taking the snapshot so no event falls in between
+        async with progress_broker.subscribe(case_id) as subscription:
+            snapshot_db = SessionLocal()
+            try:
+                current = AudioForensicsService(snapshot_db).get_case(case_id)
+                stages = {stage: getattr(current, f"{stage}_completed") for stage in STAGES} if current else {}
+            finally:
+                snapshot_db.close()
+            yield sse({"type": "snapshot", "case_id": case_id, "stages": stages})
+            if "pending" not in stages.values():
+                return
+            
+            deadline = time.monotonic() + PROGRESS_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline and not await request.is_disconnected():
+                event = await subscription.get(timeout=15)
+                if event is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse(event)
+                if event["type"] in ("case_completed", "case_failed"):
+                    return
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/cases/")
 async def get_cases(db: Session = Depends(get_db)):
     """Get all cases"""
@@ -172,15 +310,58 @@ async def get_cases(db: Session = Depends(get_db)):
         for case in cases
     ]
 
+# Columns behind each analysis in the case detail response
+ANALYSIS_COLUMNS = {
+    "transcription": ("transcription_text", "transcription_confidence", "transcription_language"),
+    "sentiment": ("sentiment_result", "sentiment_confidence"),
+    "gender": ("gender_result", "gender_confidence"),
+    "metadata": ("metadata_json", "original_timestamps"),
+    "temporal": ("background_splices", "phase_splices", "combined_splices"),
+    "diarization": ("estimated_speakers", "diarization_segments"),
+}
+
+# Case-level lists that can grow large; like analyses, loaded only when selected
+CASE_FIELDS = {
+    "near_duplicates": ("near_duplicates",),
+    "speech_intervals": ("speech_intervals",),
+}
+
+CASE_COLUMNS = ("case_name", "original_filename", "created_at", "updated_at", "notes", "audio_duration")
+
 @app.get("/cases/{case_id}")
-async def get_case(case_id: str, db: Session = Depends(get_db)):
-    """Get case with all analysis results"""
+async def get_case(
+    case_id: str,
+    request: Request,
+    fields: str = None,
+    layout: str = "rows",
+    db: Session = Depends(get_db)
+):
+    """Get case with analysis results
+
+    fields: comma-separated analyses and case fields to include (default: all),
+        e.g. fields=transcription,temporal,near_duplicates
+    layout: "rows" (default) or "columns" to return splices and segments as parallel arrays
+    """
+    selected = list(CASE_FIELDS) + list(ANALYSIS_COLUMNS) if not fields \
+        else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in ANALYSIS_COLUMNS and f not in CASE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if layout not in ("rows", "columns"):
+        raise HTTPException(status_code=400, detail="layout must be 'rows' or 'columns'")
+    
+    analyses = [f for f in selected if f in ANALYSIS_COLUMNS]
+    case_fields = [f for f in selected if f in CASE_FIELDS]
+    columns = list(CASE_COLUMNS) + [column for field in case_fields for column in CASE_FIELDS[field]] \
+        + [column for analysis in analyses for column in ANALYSIS_COLUMNS[analysis]]
+    
     service = AudioForensicsService(db)
-    case = service.get_case(case_id)
+    case = service.get_case(case_id, columns=columns)
     
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     
+    columnar = layout == "columns"
     result = {
         "id": case.id,
         "name": case.case_name,
@@ -188,11 +369,16 @@ async def get_case(case_id: str, db: Session = Depends(get_db)):
         "created_at": case.created_at.isoformat(),
         "updated_at": case.updated_at.isoformat(),
         "notes": case.notes,
-        "analyses": {}
+        "audio_duration": case.audio_duration
     }
+    if "near_duplicates" in case_fields:
+        result["near_duplicates"] = case.near_duplicates or []
+    if "speech_intervals" in case_fields:
+        result["speech_intervals"] = case.speech_intervals
+    result["analyses"] = {}
     
     # Add transcription
-    if case.transcription_text:
+    if "transcription" in analyses and case.transcription_text:
         result["analyses"]["transcription"] = {
             "text": case.transcription_text,
             "confidence": case.transcription_confidence,
@@ -200,59 +386,96 @@ async def get_case(case_id: str, db: Session = Depends(get_db)):
         }
     
     # Add sentiment
-    if case.sentiment_result:
+    if "sentiment" in analyses and case.sentiment_result:
         result["analyses"]["sentiment"] = {
             "sentiment": case.sentiment_result,
             "confidence": case.sentiment_confidence
         }
     
     # Add gender detection
-    if case.gender_result:
+    if "gender" in analyses and case.gender_result:
         result["analyses"]["gender"] = {
             "gender": case.gender_result,
             "confidence": case.gender_confidence
         }
     
     # Add metadata
-    if case.metadata_json:
+    if "metadata" in analyses and case.metadata_json:
         result["analyses"]["metadata"] = {
             "metadata": case.metadata_json,
             "original_timestamps": case.original_timestamps
         }
     
     # Add temporal analysis
-    if case.combined_splices:
+    if "temporal" in analyses and case.combined_splices:
+        splices = (case.background_splices, case.phase_splices, case.combined_splices)
+        if columnar:
+            splices = tuple(to_columns(s or []) for s in splices)
         result["analyses"]["temporal"] = {
-            "background_splices": case.background_splices,
-            "phase_splices": case.phase_splices,
-            "combined_splices": case.combined_splices
+            "background_splices": splices[0],
+            "phase_splices": splices[1],
+            "combined_splices": splices[2]
         }
     
     # Add diarization
-    if case.diarization_segments:
+    if "diarization" in analyses and case.diarization_segments:
         result["analyses"]["diarization"] = {
             "estimated_speakers": case.estimated_speakers,
-            "segments": case.diarization_segments
+            "segments": to_columns(case.diarization_segments) if columnar else case.diarization_segments
         }
     
-    return result
+    return encode_response(request, result)
 
-@app.delete("/cases/{case_id}")
+@app.delete("/cases/{case_id}", status_code=202)
 async def delete_case(case_id: str, db: Session = Depends(get_db)):
-    """Delete a case and all associated data"""
+    """Delete a case; its files and derived artifacts are removed in the background"""
     service = AudioForensicsService(db)
     success = service.delete_case(case_id)
     
     if not success:
         raise HTTPException(status_code=404, detail="Case not found")
     
+    speaker_index.remove_case(case_id)
+    fingerprint_index.remove_case(case_id)
     return {"message": "Case deleted successfully"}
 
+@app.get("/cases/{case_id}/speakers/{speaker}/matches")
+async def match_speaker(case_id: str, speaker: str, k: int = 5, db: Session = Depends(get_db)):
+    """Most similar speakers in other cases"""
+    service = AudioForensicsService(db)
+    case = service.get_case(case_id)
+    
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    if not case.speaker_embeddings or speaker not in case.speaker_embeddings:
+        raise HTTPException(status_code=404, detail="No embedding for this speaker")
+    
+    speaker_index.refresh(db)
+    matches = speaker_index.query(case.speaker_embeddings[speaker], k=min(max(k, 1), 50), exclude_case=case_id)
+    
+    names = service.get_case_names([match["case_id"] for match in matches])
+    for match in matches:
+        match["case_name"] = names.get(match["case_id"])
+    
+    return {"case_id": case_id, "speaker": speaker, "matches": matches}
+
+@app.get("/search/")
+async def search_transcripts(q: str, limit: int = 20, case_id: str = None, db: Session = Depends(get_db)):
+    """Ranked keyword search across case and segment transcripts"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    
+    service = AudioForensicsService(db)
+    hits = service.search_transcripts(q, limit=min(max(limit, 1), 100), case_id=case_id)
+    return {"query": q, "hits": hits}
+
 # Individual Analysis Endpoints (for segment analysis)
 @app.post("/cases/{case_id}/segments/{segment_index}/transcribe")
 async def transcribe_segment(
     case_id: str, 
     segment_index: int, 
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Transcribe a specific diarization segment"""
@@ -267,6 +490,10 @@ async def transcribe_segment(
     
     segment = case.diarization_segments[segment_index]
     
+    # Segment calls are interactive and go ahead of queued bulk analyses
+    cost = (float(segment['end']) - float(segment['start'])) * COST_WEIGHTS["transcription"]
+    ticket = await admission_controller.acquire(client_key(request), cost, PRIORITY_INTERACTIVE)
+    
     try:
         # Download segment file
         url = segment['file_url'] if segment['file_url'].startswith('http') else f"http://127.0.0.1:8000{segment['file_url']}"
@@ -275,7 +502,8 @@ async def transcribe_segment(
         response.raise_for_status()
         
         # Transcribe
-        transcription_text = transcribe_audio(response.content, f"segment_{segment_index}.wav")
+        suffix = os.path.splitext(segment['file_url'])[1] or ".wav"
+        transcription_text = await analyzer_pool.run(transcribe_audio, response.content, f"segment_{segment_index}{suffix}")
         
         # Update segment
         service.update_segment_analysis(case_id, segment_index, transcription=transcription_text)
@@ -284,6 +512,8 @@ async def transcribe_segment(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission_controller.release(ticket)
 
 @app.post("/cases/{case_id}/segments/{segment_index}/sentiment")
 async def analyze_segment_sentiment(
@@ -307,7 +537,7 @@ async def analyze_segment_sentiment(
         raise HTTPException(status_code=400, detail="Segment must be transcribed first")
     
     try:
-        sentiment_result = get_sentiment(segment['transcription'])
+        sentiment_result = await analyzer_pool.run(get_sentiment, segment['transcription'])
         
         # Update segment
         service.update_segment_analysis(case_id, segment_index, sentiment=sentiment_result)
@@ -321,6 +551,7 @@ async def analyze_segment_sentiment(
 async def detect_segment_gender(
     case_id: str, 
     segment_index: int, 
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Detect gender for a specific diarization segment"""
@@ -335,6 +566,9 @@ async def detect_segment_gender(
     
     segment = case.diarization_segments[segment_index]
     
+    cost = (float(segment['end']) - float(segment['start'])) * COST_WEIGHTS["gender"]
+    ticket = await admission_controller.acquire(client_key(request), cost, PRIORITY_INTERACTIVE)
+    
     try:
         # Download segment file
         url = segment['file_url'] if segment['file_url'].startswith('http') else f"http://127.0.0.1:8000{segment['file_url']}"
@@ -343,12 +577,13 @@ async def detect_segment_gender(
         response.raise_for_status()
         
         # Save temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        suffix = os.path.splitext(segment['file_url'])[1] or ".wav"
+        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=suffix) as tmp:
             tmp.write(response.content)
             temp_path = tmp.name
         
         try:
-            gender_result = process_audio(temp_path)
+            gender_result = await analyzer_pool.run(process_audio, temp_path)
             if isinstance(gender_result, dict):
                 gender = gender_result.get("gender", str(gender_result))
             else:
@@ -365,29 +600,31 @@ async def detect_segment_gender(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission_controller.release(ticket)
 
 # Legacy endpoints (for backward compatibility with ExploreFunctionalities)
-@app.post("/transcribe/")
+@app.post("/transcribe/", dependencies=[Depends(admit_upload("transcription"))])
 async def transcribe_endpoint(file: UploadFile = File(...)):
     try:
         if not file.filename.endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
         file_bytes = await file.read()
-        transcription = transcribe_audio(file_bytes, file.filename)
+        transcription = await analyzer_pool.run(transcribe_audio, file_bytes, file.filename)
         return {"transcription": transcription}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/sentiment/")
+@app.post("/sentiment/", dependencies=[Depends(admit_upload("sentiment"))])
 async def sentiment_endpoint(file: UploadFile = File(...)):
     try:
         if not file.filename.endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
         file_bytes = await file.read()
-        transcription = transcribe_audio(file_bytes, file.filename)
-        sentiment = get_sentiment(transcription)
+        transcription = await analyzer_pool.run(transcribe_audio, file_bytes, file.filename)
+        sentiment = await analyzer_pool.run(get_sentiment, transcription)
         return {
             "transcription": transcription,
             "sentiment": sentiment
@@ -395,17 +632,17 @@ async def sentiment_endpoint(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/gender/")
+@app.post("/gender/", dependencies=[Depends(admit_upload("gender"))])
 async def detect_gender(file: UploadFile = File(...)):
     try:
         if not file.filename.endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
+        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=".wav") as temp_audio:
             temp_audio.write(await file.read())
             temp_path = temp_audio.name
 
-        gender = process_audio(temp_path)
+        gender = await analyzer_pool.run(process_audio, temp_path)
         if isinstance(gender, dict):
             gender = gender.get("gender", str(gender))
         else:
@@ -415,21 +652,22 @@ async def detect_gender(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/diarization/")
+@app.post("/diarization/", dependencies=[Depends(admit_upload("diarization"))])
 async def diarization_endpoint(file: UploadFile = File(...)):
     try:
         if not file.filename.lower().endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
         suffix = os.path.splitext(file.filename)[1] or ".wav"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_audio:
+        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=suffix) as temp_audio:
             temp_audio.write(await file.read())
             temp_path = temp_audio.name
 
         try:
-            results = run_diarization(
+            results = await analyzer_pool.run(
+                run_diarization,
                 temp_path,
-                segments_dir="static/segments",
+                segments_dir=SEGMENTS_DIR,
                 public_base="/static/segments"
             )
         finally:
@@ -444,7 +682,7 @@ async def diarization_endpoint(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/metadata/")
+@app.post("/metadata/", dependencies=[Depends(admit_upload("metadata"))])
 async def comprehensive_metadata_endpoint(
     file: UploadFile = File(...),
     original_modified: str = Form(None),
@@ -454,7 +692,7 @@ async def comprehensive_metadata_endpoint(
         if not file.filename.endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac", ".wma", ".aiff")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp:
+        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=Path(file.filename).suffix) as tmp:
             content = await file.read()
             tmp.write(content)
             temp_path = tmp.name
@@ -480,7 +718,8 @@ async def comprehensive_metadata_endpoint(
                 except:
                     original_timestamps['created'] = None
 
-            result = extract_audio_metadata(
+            result = await analyzer_pool.run(
+                extract_audio_metadata,
                 filepath=temp_path,
                 original_filename=file.filename,
                 original_timestamps=original_timestamps if original_timestamps else None
@@ -507,19 +746,19 @@ async def comprehensive_metadata_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Metadata analysis error: {str(e)}")
 
-@app.post("/temporal_inconsistency/")
+@app.post("/temporal_inconsistency/", dependencies=[Depends(admit_upload("temporal"))])
 async def temporal_inconsistency_endpoint(file: UploadFile = File(...)):
     try:
         if not file.filename.endswith((".wav", ".mp3", ".m4a", ".flac", ".ogg")):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=".wav") as tmp:
             content = await file.read()
             tmp.write(content)
             temp_path = tmp.name
 
         try:
-            bg_res, phase_res, high_confidence_splices = analyze_audio_splices(temp_path)
+            bg_res, phase_res, high_confidence_splices = await analyzer_pool.run(analyze_audio_splices, temp_path)
 
             background_splices = [
                 {"time": float(time), "confidence": float(conf)}
@@ -0,0 +1,116 @@
+"""
+Pub/sub for case analysis progress events.
+
+The API publishes stage start/finish events and partial results per case;
+the SSE endpoint relays them to clients. The in-process broker works for a
+single API process. Set PROGRESS_REDIS_URL to use any Redis-protocol server
+(Redis, Valkey, KeyDB, ...) so events cross process and node boundaries.
+"""
+
+import asyncio
+import json
+import os
+from collections import defaultdict
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed for the Redis backend
+    aioredis = None
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def _channel(case_id: str) -> str:
+    return f"audioforensics:case:{case_id}"
+
+
+class _QueueSubscription:
+    def __init__(self, broker, channel):
+        self._broker = broker
+        self._channel = channel
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    async def __aenter__(self):
+        self._broker._subscribers[self._channel].add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        subscribers = self._broker._subscribers.get(self._channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self._broker._subscribers[self._channel]
+
+    async def get(self, timeout: float = None):
+        """Next event, or None if none arrives within timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """Delivers events to subscribers in the same process and event loop"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    async def publish(self, case_id: str, event: dict):
+        for subscription in list(self._subscribers.get(_channel(case_id), ())):
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(event)
+
+    def subscribe(self, case_id: str):
+        """Async context manager yielding a subscription with get(timeout)"""
+        return _QueueSubscription(self, _channel(case_id))
+
+    async def close(self):
+        self._subscribers.clear()
+
+
+class _RedisSubscription:
+    def __init__(self, client, channel):
+        self._pubsub = client.pubsub()
+        self._channel = channel
+
+    async def __aenter__(self):
+        await self._pubsub.subscribe(self._channel)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._pubsub.unsubscribe(self._channel)
+        await self._pubsub.close()
+
+    async def get(self, timeout: float = None):
+        """Next event, or None if none arrives within timeout"""
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message["data"])
+
+
+class RedisBroker:
+    """Relays events through a Redis-protocol server's pub/sub"""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("PROGRESS_REDIS_URL is set but the 'redis' package is not installed")
+        self._client = aioredis.from_url(url)
+
+    async def publish(self, case_id: str, event: dict):
+        await self._client.publish(_channel(case_id), json.dumps(event, default=str))
+
+    def subscribe(self, case_id: str):
+        """Async context manager yielding a subscription with get(timeout)"""
+        return _RedisSubscription(self._client, _channel(case_id))
+
+    async def close(self):
+        await self._client.close()
+
+
+def broker_from_env():
+    """Redis broker if PROGRESS_REDIS_URL is set, otherwise in-process"""
+    url = os.getenv("PROGRESS_REDIS_URL")
+    return RedisBroker(url) if url else InProcessBroker()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Re-analysis job for Audio Forensics cases.
+Recomputes only the stages whose analyzer version or input changed, using
+each case's stored audio file, with a bounded number of cases in flight.
+
+Examples:
+    python reanalyze.py                          # every stale stage of every case
+    python reanalyze.py --stage gender           # only the gender classifier
+    python reanalyze.py --case-id ID --force     # rerun everything for one case
+    python reanalyze.py --created-after 2025-01-01 --concurrency 8
+    python reanalyze.py --stage diarization --enqueue   # hand off to worker.py processes
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from analysis_pipeline import STAGES, AnalysisPipeline, plan_stages
+from analysis_pool import AnalyzerPool
+from database.connection import SessionLocal, create_tables
+from database.jobs import AnalysisJobQueue
+from database.services import AudioForensicsService
+
+
+async def reanalyze_case(case_id: str, pool: AnalyzerPool, stages, force: bool, dry_run: bool) -> list:
+    """Recompute stale stages of one case in its own session; returns the stages that ran"""
+    db = SessionLocal()
+    try:
+        service = AudioForensicsService(db)
+        case = service.get_case(case_id)
+        if not case:
+            return []
+
+        if not os.path.exists(case.file_path):
+            print(f"⚠️  {case_id}: audio file missing at {case.file_path}, skipped")
+            return []
+
+        if dry_run:
+            return plan_stages(case, stages, force)
+
+        pipeline = AnalysisPipeline(service, pool)
+        return await pipeline.run_stale(case, case.file_path, stages=stages, force=force)
+    finally:
+        db.close()
+
+
+async def reanalyze(case_ids, stages, concurrency: int, force: bool, dry_run: bool) -> int:
+    """Re-analyze the given cases with at most `concurrency` in flight; returns the failure count"""
+    pool = AnalyzerPool.from_env()
+    pool.workers = max(pool.workers, concurrency)
+    if not dry_run:
+        pool.start()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def worker(case_id):
+        nonlocal failures
+        async with semaphore:
+            try:
+                ran = await reanalyze_case(case_id, pool, stages, force, dry_run)
+                if ran:
+                    verb = "would rerun" if dry_run else "reran"
+                    print(f"✅ {case_id}: {verb} {', '.join(ran)}")
+            except Exception as e:
+                failures += 1
+                print(f"❌ {case_id}: {e}")
+
+    try:
+        await asyncio.gather(*(worker(case_id) for case_id in case_ids))
+    finally:
+        pool.shutdown()
+    return failures
+
+
+def enqueue(case_ids, stages, force: bool) -> int:
+    """Queue one stale-stage job per case for worker processes; returns the number queued"""
+    db = SessionLocal()
+    try:
+        queue = AnalysisJobQueue(db)
+        for case_id in case_ids:
+            queue.enqueue(case_id, stages=list(stages), options={"stale_only": True, "force": force})
+    finally:
+        db.close()
+    return len(case_ids)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute stale analysis results")
+    parser.add_argument("--stage", action="append", choices=STAGES,
+                        help="Limit to this stage (repeatable); dependents are included")
+    parser.add_argument("--case-id", action="append", help="Limit to this case (repeatable)")
+    parser.add_argument("--created-after", type=datetime.fromisoformat, help="Only cases created on/after this date")
+    parser.add_argument("--created-before", type=datetime.fromisoformat, help="Only cases created before this date")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("REANALYZE_CONCURRENCY", "2")),
+                        help="Cases processed in parallel")
+    parser.add_argument("--force", action="store_true", help="Rerun selected stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages are stale")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Queue the cases for worker.py instead of re-analyzing here")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    create_tables()
+
+    db = SessionLocal()
+    try:
+        case_ids = AudioForensicsService(db).get_case_ids(
+            case_ids=args.case_id,
+            created_after=args.created_after,
+            created_before=args.created_before
+        )
+    finally:
+        db.close()
+
+    if args.enqueue and not args.dry_run:
+        queued = enqueue(case_ids, stages=args.stage or STAGES, force=args.force)
+        print(f"📥 Queued {queued} case(s) for re-analysis")
+        sys.exit(0)
+
+    print(f"Checking {len(case_ids)} case(s) for stale analyses...")
+    failures = asyncio.run(reanalyze(
+        case_ids,
+        stages=args.stage or STAGES,
+        concurrency=max(1, args.concurrency),
+        force=args.force,
+        dry_run=args.dry_run
+    ))
+    if failures:
+        print(f"\n{failures} case(s) failed")
+        sys.exit(1)
+    print("\n🎉 Re-analysis finished")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Background cleanup for deleted cases and orphaned files.
+
+Deleting a case only marks its row. The reaper later removes the row and
+every artifact it owns in small batches, and a periodic sweep removes
+segment, blob and temp files that no case row references any more.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from database.connection import BackgroundSessionLocal
+from database.blob_store import SEGMENTS_DIR, STATIC_DIR
+from database.services import AudioForensicsService
+
+# Prefix for temp files created by the API, so the sweep can recognise them
+TEMP_PREFIX = "afx_"
+
+LEGACY_UPLOADS_DIR = "uploads/cases"
+
+
+class CaseReaper:
+    """Purges deleted cases and sweeps orphaned files"""
+
+    def __init__(self, batch_size: int = 20, min_age: float = 86400):
+        self.batch_size = batch_size
+        # Files younger than this may belong to an analysis still in progress
+        self.min_age = min_age
+
+    def reap_batch(self) -> int:
+        """Purge up to batch_size deleted cases; returns how many were purged"""
+        db = BackgroundSessionLocal()
+        try:
+            service = AudioForensicsService(db)
+            purged = 0
+            for case_id in service.get_deleted_case_ids(limit=self.batch_size):
+                try:
+                    if service.purge_case(case_id):
+                        purged += 1
+                except Exception as e:
+                    db.rollback()
+                    print(f"Error purging case {case_id}: {e}")
+            return purged
+        finally:
+            db.close()
+
+    def collect_garbage(self) -> int:
+        """Remove old files that no case references; returns how many were removed"""
+        db = BackgroundSessionLocal()
+        try:
+            service = AudioForensicsService(db)
+            file_paths, segment_urls = service.get_referenced_files()
+            segment_paths = set()
+            for url in segment_urls:
+                path = service.segments.path_for_url(url) or service._legacy_segment_path(url)
+                if path:
+                    segment_paths.add(path)
+            uploads_root, segments_root = service.uploads.root, service.segments.root
+        finally:
+            db.close()
+
+        # Compare resolved paths: the same store may be configured by a relative
+        # path in one place and an absolute one (or via a symlink) in another.
+        # Rows may also hold paths relative to another working directory, so a
+        # file whose name matches a referenced one (blob names are digests) is
+        # kept too. Any referenced file is kept, whichever root it turns up under.
+        referenced = {os.path.realpath(path) for path in file_paths | segment_paths}
+        referenced |= {os.path.basename(path) for path in file_paths | segment_paths}
+        stores = [os.path.realpath(path) for path in (uploads_root, segments_root, STATIC_DIR)]
+        roots = [uploads_root, segments_root, SEGMENTS_DIR]
+        # Legacy uploads sit next to the default upload store; elsewhere they are not ours
+        legacy_root = os.path.realpath(LEGACY_UPLOADS_DIR)
+        if os.path.dirname(legacy_root) == os.path.dirname(stores[0]):
+            stores.append(legacy_root)
+            roots.append(LEGACY_UPLOADS_DIR)
+
+        cutoff = time.time() - self.min_age
+        removed = 0
+        swept = set()
+        for root in roots:
+            root = os.path.realpath(root)
+            if root in swept:
+                continue
+            swept.add(root)
+            if not any(root == store or root.startswith(store + os.sep) for store in stores):
+                print(f"Skipping orphan sweep of {root}: outside the configured stores")
+                continue
+            removed += self._sweep(root, referenced, cutoff)
+        removed += self._sweep_temp(cutoff)
+        return removed
+
+    def _sweep(self, root: str, referenced: set, cutoff: float) -> int:
+        removed = 0
+        for dirpath, _, filenames in os.walk(root, topdown=False):
+            for filename in filenames:
+                path = os.path.realpath(os.path.join(dirpath, filename))
+                if path in referenced or filename in referenced or self._is_recent(path, cutoff):
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            if dirpath != root:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+        return removed
+
+    def _sweep_temp(self, cutoff: float) -> int:
+        removed = 0
+        tmp_dir = tempfile.gettempdir()
+        for filename in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, filename)
+            if not filename.startswith(TEMP_PREFIX) or self._is_recent(path, cutoff):
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    @staticmethod
+    def _is_recent(path: str, cutoff: float) -> bool:
+        try:
+            return os.path.getmtime(path) > cutoff
+        except OSError:
+            return True
+
+    async def run_forever(self, reap_interval: float = 30, gc_interval: float = 3600):
+        """Reap deleted cases every reap_interval and sweep orphans every gc_interval"""
+        last_gc = 0.0
+        while True:
+            try:
+                # Keep reaping without sleeping while a backlog remains. These run
+                # in threads, so they use BackgroundSessionLocal connections.
+                while await asyncio.to_thread(self.reap_batch) >= self.batch_size:
+                    pass
+                if time.monotonic() - last_gc >= gc_interval:
+                    removed = await asyncio.to_thread(self.collect_garbage)
+                    if removed:
+                        print(f"Removed {removed} orphaned file(s)")
+                    last_gc = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in case reaper: {e}")
+            await asyncio.sleep(reap_interval)
+
+    @classmethod
+    def from_env(cls) -> "CaseReaper":
+        """Build a reaper from REAPER_* environment variables"""
+        return cls(
+            batch_size=int(os.getenv("REAPER_BATCH_SIZE", "20")),
+            min_age=float(os.getenv("REAPER_ORPHAN_MIN_AGE", "86400")),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge deleted cases and orphaned files once")
+    parser.add_argument("--skip-gc", action="store_true", help="Only purge deleted cases")
+    args = parser.parse_args()
+
+    reaper = CaseReaper.from_env()
+    total = 0
+    while True:
+        purged = reaper.reap_batch()
+        total += purged
+        if purged < reaper.batch_size:
+            break
+    print(f"✅ Purged {total} deleted case(s)")
+    if not args.skip_gc:
+        print(f"✅ Removed {reaper.collect_garbage()} orphaned file(s)")
@@ -0,0 +1,71 @@
+"""
+Compact response encoding for large case payloads.
+
+Clients choose the content type with the Accept header (msgpack when the
+msgpack package is installed, JSON otherwise, serialized with orjson when
+available) and get gzip or brotli compression according to Accept-Encoding.
+Splice and segment lists can also be returned column-wise, which drops the
+repeated keys of the row-wise form.
+"""
+
+import gzip
+import json
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Below this size compression costs more than it saves
+COMPRESS_MIN_BYTES = 1024
+
+
+def to_columns(rows: list) -> dict:
+    """Turn a list of dicts into a dict of lists keyed by field"""
+    if not rows:
+        return {}
+    keys = []
+    for row in rows:
+        for key in row:
+            if key not in keys:
+                keys.append(key)
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+def _dumps_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def encode_response(request: Request, payload) -> Response:
+    """Serialize and compress a payload according to the request's Accept headers"""
+    accept = request.headers.get("accept", "")
+    if msgpack is not None and "application/msgpack" in accept:
+        body, media_type = msgpack.packb(payload, default=str), "application/msgpack"
+    else:
+        body, media_type = _dumps_json(payload), "application/json"
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accept_encoding = request.headers.get("accept-encoding", "")
+        if brotli is not None and "br" in accept_encoding:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accept_encoding:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -7,8 +7,9 @@ This script creates the single table and sets up the initial schema.
 import os
 import sys
 from sqlalchemy import create_engine, text
-from database.connection import engine, create_tables
+from database.connection import engine, create_tables, SessionLocal
 from database.models import Base
+from database.search import TranscriptSearchIndex
 
 def setup_database():
     """Set up the database with the single table"""
@@ -22,6 +23,14 @@ def setup_database():
             result = conn.execute(text("SELECT COUNT(*) FROM audioforensics_cases"))
             count = result.scalar()
             print(f"✅ Database connection test successful. audioforensics_cases table has {count} records.")
+        
+        # Index transcripts of cases created before the search index existed
+        db = SessionLocal()
+        try:
+            indexed = TranscriptSearchIndex(db).rebuild()
+            print(f"✅ Transcript search index rebuilt for {indexed} cases.")
+        finally:
+            db.close()
             
     except Exception as e:
         print(f"❌ Error setting up database: {e}")
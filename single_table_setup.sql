@@ -1,15 +1,25 @@
 -- Single Table Setup for Audio Forensics Application
 -- Run this in pgAdmin 4 Query Tool
+--
+-- Safe to run again on an existing database: every statement only creates
+-- what is missing, and the ALTER TABLE block adds columns introduced after
+-- the first release.
 
-CREATE TABLE audioforensics_cases (
+CREATE TABLE IF NOT EXISTS audioforensics_cases (
     -- Primary key and basic info
     id VARCHAR PRIMARY KEY,
     case_name VARCHAR NOT NULL,
     original_filename VARCHAR NOT NULL,
     file_path VARCHAR NOT NULL,
+    file_hash VARCHAR,  -- SHA-256 of the uploaded file
+    audio_fingerprint BYTEA,  -- uint32 spectral sub-fingerprints
+    near_duplicates JSONB,  -- [{case_id, similarity, offset_seconds, ...}]
+    audio_duration FLOAT,  -- seconds
+    speech_intervals JSONB,  -- [[start, end], ...] voiced regions in seconds
     notes TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP,  -- set on delete; row and files are purged in the background
     
     -- Transcription data
     transcription_text TEXT,
@@ -36,6 +46,7 @@ CREATE TABLE audioforensics_cases (
     -- Diarization data
     estimated_speakers INTEGER,
     diarization_segments JSONB,  -- Array of segment objects with transcription, sentiment, gender
+    speaker_embeddings JSONB,  -- {speaker: [float, ...]} for cross-case voice matching
     
     -- Analysis status flags
     transcription_completed VARCHAR DEFAULT 'pending',  -- pending, completed, failed
@@ -43,13 +54,66 @@ CREATE TABLE audioforensics_cases (
     gender_completed VARCHAR DEFAULT 'pending',
     metadata_completed VARCHAR DEFAULT 'pending',
     temporal_completed VARCHAR DEFAULT 'pending',
-    diarization_completed VARCHAR DEFAULT 'pending'
+    diarization_completed VARCHAR DEFAULT 'pending',
+    
+    -- Analyzer provenance per stage: {stage: {version, input_hash, analyzed_at}}
+    analysis_versions JSONB
 );
 
+-- Upgrading an existing table: add columns introduced after the first release
+-- (no-ops on a table created above)
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS file_hash VARCHAR;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS analysis_versions JSONB;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS speaker_embeddings JSONB;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS audio_fingerprint BYTEA;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS near_duplicates JSONB;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS audio_duration FLOAT;
+ALTER TABLE audioforensics_cases ADD COLUMN IF NOT EXISTS speech_intervals JSONB;
+
 -- Create indexes for better performance
-CREATE INDEX idx_audioforensics_cases_created_at ON audioforensics_cases(created_at);
-CREATE INDEX idx_audioforensics_cases_case_name ON audioforensics_cases(case_name);
-CREATE INDEX idx_audioforensics_cases_original_filename ON audioforensics_cases(original_filename);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_cases_created_at ON audioforensics_cases(created_at);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_cases_case_name ON audioforensics_cases(case_name);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_cases_original_filename ON audioforensics_cases(original_filename);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_cases_file_hash ON audioforensics_cases(file_hash);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_cases_deleted_at ON audioforensics_cases(deleted_at);
+
+-- Full-text search over case and segment transcripts
+-- (segment_index is NULL for the full-case transcript)
+CREATE TABLE IF NOT EXISTS audioforensics_transcript_index (
+    id SERIAL PRIMARY KEY,
+    case_id VARCHAR NOT NULL REFERENCES audioforensics_cases(id) ON DELETE CASCADE,
+    segment_index INTEGER,
+    speaker VARCHAR,
+    start_time FLOAT,
+    end_time FLOAT,
+    text TEXT NOT NULL,
+    tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', text)) STORED
+);
+
+CREATE INDEX IF NOT EXISTS idx_transcript_index_tsv ON audioforensics_transcript_index USING GIN (tsv);
+CREATE INDEX IF NOT EXISTS idx_transcript_index_case_id ON audioforensics_transcript_index(case_id);
+
+-- Analysis jobs for worker.py (ANALYSIS_MODE=queue)
+CREATE TABLE IF NOT EXISTS audioforensics_analysis_jobs (
+    id VARCHAR PRIMARY KEY,
+    case_id VARCHAR NOT NULL,
+    stages JSONB,  -- stage names to run; NULL means all
+    options JSONB,
+    status VARCHAR DEFAULT 'queued',  -- queued, running, completed, failed
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    locked_by VARCHAR,  -- worker holding the lease
+    locked_until TIMESTAMP,  -- lease expiry
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_audioforensics_analysis_jobs_case_id ON audioforensics_analysis_jobs(case_id);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_analysis_jobs_status ON audioforensics_analysis_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_audioforensics_analysis_jobs_created_at ON audioforensics_analysis_jobs(created_at);
 
 -- Create trigger to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -60,6 +124,7 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+DROP TRIGGER IF EXISTS update_audioforensics_cases_updated_at ON audioforensics_cases;
 CREATE TRIGGER update_audioforensics_cases_updated_at 
     BEFORE UPDATE ON audioforensics_cases 
     FOR EACH ROW 
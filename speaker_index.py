@@ -0,0 +1,244 @@
+"""
+Cross-case speaker matching.
+
+Diarization stores one embedding per speaker on the case. SpeakerIndex
+keeps every live embedding in a contiguous float32 matrix with
+random-hyperplane LSH buckets for approximate nearest-neighbour lookup,
+reranked by exact cosine similarity. Once it holds enough speakers, each
+dimension is standardized by the population mean and standard deviation
+before the cosine, so no single large feature decides the match. The index
+is rebuilt from the database on startup and kept current incrementally.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from database.models import AudioForensicsCase
+
+# Frame features used when the diarizer does not return its own embeddings
+EMBEDDING_SAMPLE_RATE = 16000
+EMBEDDING_MFCCS = 20
+
+
+def compute_speaker_embeddings(audio_path: str, segments: list) -> dict:
+    """Per-speaker MFCC statistics (mean, std, delta mean) over that speaker's segments
+
+    The 0th coefficient is left out: it is frame energy, which follows the
+    recording level rather than the voice and would otherwise dominate.
+    """
+    import librosa
+
+    audio, sample_rate = librosa.load(audio_path, sr=EMBEDDING_SAMPLE_RATE, mono=True)
+    by_speaker = {}
+    for segment in segments:
+        start = int(float(segment['start']) * sample_rate)
+        end = int(float(segment['end']) * sample_rate)
+        if end - start < sample_rate // 10:
+            continue
+        by_speaker.setdefault(segment['speaker'], []).append(audio[start:end])
+
+    embeddings = {}
+    for speaker, chunks in by_speaker.items():
+        mfcc = librosa.feature.mfcc(y=np.concatenate(chunks), sr=sample_rate, n_mfcc=EMBEDDING_MFCCS)[1:]
+        delta = librosa.feature.delta(mfcc) if mfcc.shape[1] >= 9 else np.zeros_like(mfcc)
+        vector = np.concatenate([mfcc.mean(axis=1), mfcc.std(axis=1), delta.mean(axis=1)])
+        embeddings[speaker] = vector.astype(np.float32).tolist()
+    return embeddings
+
+
+class SpeakerIndex:
+    """Approximate nearest-neighbour index over per-speaker embeddings"""
+
+    def __init__(self, n_tables: int = 8, n_bits: int = 10, refresh_interval: float = 5.0, seed: int = 0,
+                 min_population: int = 20):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.refresh_interval = refresh_interval
+        # Speakers needed before dimensions are standardized by population statistics
+        self.min_population = min_population
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self._dim = None
+        self._planes = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)   # standardized, unit length
+        self._raw = np.zeros((0, 0), dtype=np.float32)       # as stored on the case
+        self._mean = None
+        self._scale = None
+        self._standardized_at = 0  # population the statistics were computed from
+        self._size = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._keys = []            # row -> (case_id, speaker)
+        self._rows_by_case = {}    # case_id -> [row, ...]
+        self._buckets = [dict() for _ in range(n_tables)]
+        self._watermark = None
+        self._last_refresh = 0.0
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._rows_by_case.values())
+
+    def _init_dim(self, dim: int):
+        self._dim = dim
+        self._planes = self._rng.standard_normal((self.n_tables, dim, self.n_bits)).astype(np.float32)
+        self._vectors = np.zeros((64, dim), dtype=np.float32)
+        self._raw = np.zeros((64, dim), dtype=np.float32)
+        self._alive = np.zeros(64, dtype=bool)
+        self._powers = (1 << np.arange(self.n_bits)).astype(np.int64)
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH bucket code of each vector in each table, shape (tables, n)"""
+        bits = np.einsum("nd,tdb->tnb", vectors, self._planes) > 0
+        return bits.astype(np.int64) @ self._powers
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _standardize(self, vectors: np.ndarray) -> np.ndarray:
+        """Population-standardized (once statistics exist), unit-length vectors"""
+        if self._mean is not None:
+            vectors = (vectors - self._mean) / self._scale
+        return self._normalize(vectors)
+
+    def add_case(self, case_id: str, embeddings: dict):
+        """Insert (or replace) the speakers of one case"""
+        with self._lock:
+            self.remove_case(case_id)
+            if not embeddings:
+                return
+            speakers = list(embeddings)
+            vectors = np.asarray([embeddings[s] for s in speakers], dtype=np.float32)
+            if vectors.ndim != 2:
+                return
+            if self._dim is None:
+                self._init_dim(vectors.shape[1])
+            if vectors.shape[1] != self._dim:
+                print(f"Skipping speaker embeddings for case {case_id}: dimension {vectors.shape[1]} != {self._dim}")
+                return
+            standardized = self._standardize(vectors)
+
+            needed = self._size + len(vectors)
+            if needed > len(self._vectors):
+                capacity = max(needed, 2 * len(self._vectors))
+                grown = np.zeros((capacity, self._dim), dtype=np.float32)
+                grown[:self._size] = self._vectors[:self._size]
+                raw = np.zeros((capacity, self._dim), dtype=np.float32)
+                raw[:self._size] = self._raw[:self._size]
+                alive = np.zeros(capacity, dtype=bool)
+                alive[:self._size] = self._alive[:self._size]
+                self._vectors, self._raw, self._alive = grown, raw, alive
+
+            rows = list(range(self._size, needed))
+            self._vectors[rows] = standardized
+            self._raw[rows] = vectors
+            self._alive[rows] = True
+            self._size = needed
+            self._keys.extend((case_id, speaker) for speaker in speakers)
+            self._rows_by_case[case_id] = rows
+
+            codes = self._codes(standardized)
+            for table, bucket in enumerate(self._buckets):
+                for row, code in zip(rows, codes[table]):
+                    bucket.setdefault(int(code), []).append(row)
+
+            # Recompute the statistics whenever the population has doubled
+            if len(self) >= max(self.min_population, 2 * self._standardized_at):
+                self._compact()
+
+    def remove_case(self, case_id: str):
+        """Drop the speakers of one case; storage is compacted once enough rows are dead"""
+        with self._lock:
+            rows = self._rows_by_case.pop(case_id, None)
+            if not rows:
+                return
+            self._alive[rows] = False
+            if self._size and self._alive[:self._size].sum() < self._size * 0.75:
+                self._compact()
+
+    def _compact(self):
+        """Rebuild storage and buckets from the live rows, refreshing the population statistics"""
+        entries = [
+            (case_id, {self._keys[row][1]: self._raw[row] for row in rows})
+            for case_id, rows in self._rows_by_case.items()
+        ]
+        if len(self) >= self.min_population:
+            live = self._raw[:self._size][self._alive[:self._size]].astype(np.float64)
+            self._mean = live.mean(axis=0).astype(np.float32)
+            self._scale = np.maximum(live.std(axis=0), 1e-6).astype(np.float32)
+            self._standardized_at = len(self)
+        self._vectors = np.zeros((max(64, len(self)), self._dim), dtype=np.float32)
+        self._raw = np.zeros_like(self._vectors)
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        self._size = 0
+        self._keys = []
+        self._rows_by_case = {}
+        self._buckets = [dict() for _ in range(self.n_tables)]
+        for case_id, embeddings in entries:
+            self.add_case(case_id, embeddings)
+
+    def get(self, case_id: str, speaker: str):
+        """Stored (standardized, normalized) embedding of a speaker, or None"""
+        with self._lock:
+            for row in self._rows_by_case.get(case_id, ()):
+                if self._keys[row][1] == speaker:
+                    return self._vectors[row].copy()
+        return None
+
+    def query(self, vector, k: int = 5, exclude_case: str = None) -> list[dict]:
+        """Top-k most similar speakers by cosine similarity"""
+        with self._lock:
+            if self._dim is None or not self._size:
+                return []
+            vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+            if vector.shape[1] != self._dim:
+                return []
+            vector = self._standardize(vector)
+
+            candidates = set()
+            codes = self._codes(vector)[:, 0]
+            for table, bucket in enumerate(self._buckets):
+                candidates.update(bucket.get(int(codes[table]), ()))
+            rows = np.fromiter(candidates, dtype=np.int64) if candidates else np.zeros(0, dtype=np.int64)
+            rows = rows[self._alive[rows]] if len(rows) else rows
+            if exclude_case is not None and len(rows):
+                rows = rows[[self._keys[row][0] != exclude_case for row in rows]]
+            if len(rows) < k:
+                # Too few bucket collisions: fall back to an exact scan
+                rows = np.flatnonzero(self._alive[:self._size])
+                if exclude_case is not None:
+                    rows = rows[[self._keys[row][0] != exclude_case for row in rows]]
+            if not len(rows):
+                return []
+
+            scores = self._vectors[rows] @ vector[0]
+            top = np.argsort(-scores)[:k]
+            return [
+                {"case_id": self._keys[rows[i]][0], "speaker": self._keys[rows[i]][1], "similarity": float(scores[i])}
+                for i in top
+            ]
+
+    def refresh(self, db, force: bool = False):
+        """Pick up cases changed since the last refresh (at most every refresh_interval)"""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        query = db.query(
+            AudioForensicsCase.id,
+            AudioForensicsCase.speaker_embeddings,
+            AudioForensicsCase.deleted_at,
+            AudioForensicsCase.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(AudioForensicsCase.updated_at >= self._watermark)
+        watermark = self._watermark
+        for case_id, embeddings, deleted_at, updated_at in query:
+            if deleted_at is not None or not embeddings:
+                self.remove_case(case_id)
+            else:
+                self.add_case(case_id, embeddings)
+            if updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        self._watermark = watermark or datetime.utcnow()
+        self._last_refresh = time.monotonic()
@@ -1,10 +1,20 @@
-import { postMultipart, getJson } from './apiClient';
+import { API_BASE_URL, postMultipart, getJson } from './apiClient';
+
+export interface NearDuplicateMatch {
+	case_id: string;
+	similarity: number;
+	offset_seconds: number;
+	overlap_seconds: number;
+	coverage: number;
+}
 
 export interface CreateCaseResponse {
 	id: string;
 	name: string;
 	created_at: string;
 	message: string;
+	events_url?: string;
+	near_duplicates?: NearDuplicateMatch[];
 }
 
 export interface Case {
@@ -55,14 +65,46 @@ export interface CaseWithAnalyses extends Case {
 	};
 }
 
-export async function createCase(params: { file: File; name: string; notes?: string }): Promise<CreateCaseResponse> {
+export async function createCase(params: { file: File; name: string; notes?: string; wait?: boolean }): Promise<CreateCaseResponse> {
 	const form = new FormData();
 	form.append('file', params.file);
 	form.append('name', params.name);
 	if (params.notes) form.append('notes', params.notes);
+	if (params.wait === false) form.append('wait', 'false');
 	return postMultipart<CreateCaseResponse>('/cases', form);
 }
 
+export type CaseStage = 'transcription' | 'sentiment' | 'gender' | 'metadata' | 'temporal' | 'diarization';
+
+export interface CaseProgressEvent {
+	type: 'snapshot' | 'near_duplicates' | 'speech_detected' | 'stage_started' | 'stage_completed' | 'stage_failed' | 'case_completed' | 'case_failed';
+	case_id: string;
+	stage?: CaseStage;
+	stages?: Record<CaseStage, string>;
+	result?: any;
+	error?: string;
+	matches?: NearDuplicateMatch[];
+	reused_from?: string;
+	duration?: number;
+	speech_seconds?: number;
+}
+
+// Streams analysis progress for a case; returns a function that closes the stream
+export function subscribeToCaseEvents(caseId: string, onEvent: (event: CaseProgressEvent) => void): () => void {
+	const source = new EventSource(`${API_BASE_URL}/cases/${caseId}/events`);
+	const types: CaseProgressEvent['type'][] = ['snapshot', 'near_duplicates', 'speech_detected', 'stage_started', 'stage_completed', 'stage_failed', 'case_completed', 'case_failed'];
+	types.forEach((type) => {
+		source.addEventListener(type, (message) => {
+			const event = JSON.parse((message as MessageEvent).data) as CaseProgressEvent;
+			onEvent(event);
+			// The server ends the stream after a snapshot with nothing pending; do not reconnect
+			const finished = type === 'snapshot' && !Object.values(event.stages || {}).includes('pending');
+			if (finished || type === 'case_completed' || type === 'case_failed') source.close();
+		});
+	});
+	return () => source.close();
+}
+
 export async function getAllCases(): Promise<Case[]> {
 	return getJson<Case[]>('/cases');
 }
@@ -72,7 +114,7 @@ export async function getCase(caseId: string): Promise<CaseWithAnalyses> {
 }
 
 export async function deleteCase(caseId: string): Promise<{ message: string }> {
-	const response = await fetch(`${process.env.REACT_APP_API_BASE_URL || 'http://127.0.0.1:8000'}/cases/${caseId}`, {
+	const response = await fetch(`${API_BASE_URL}/cases/${caseId}`, {
 		method: 'DELETE',
 	});
 	if (!response.ok) {
@@ -83,7 +125,7 @@ export async function deleteCase(caseId: string): Promise<{ message: string }> {
 
 // Segment analysis functions
 export async function transcribeSegment(caseId: string, segmentIndex: number): Promise<{ transcription: string }> {
-	const response = await fetch(`${process.env.REACT_APP_API_BASE_URL || 'http://127.0.0.1:8000'}/cases/${caseId}/segments/${segmentIndex}/transcribe`, {
+	const response = await fetch(`${API_BASE_URL}/cases/${caseId}/segments/${segmentIndex}/transcribe`, {
 		method: 'POST',
 	});
 	if (!response.ok) {
@@ -93,7 +135,7 @@ export async function transcribeSegment(caseId: string, segmentIndex: number): P
 }
 
 export async function analyzeSegmentSentiment(caseId: string, segmentIndex: number): Promise<{ sentiment: string }> {
-	const response = await fetch(`${process.env.REACT_APP_API_BASE_URL || 'http://127.0.0.1:8000'}/cases/${caseId}/segments/${segmentIndex}/sentiment`, {
+	const response = await fetch(`${API_BASE_URL}/cases/${caseId}/segments/${segmentIndex}/sentiment`, {
 		method: 'POST',
 	});
 	if (!response.ok) {
@@ -103,7 +145,7 @@ export async function analyzeSegmentSentiment(caseId: string, segmentIndex: numb
 }
 
 export async function detectSegmentGender(caseId: string, segmentIndex: number): Promise<{ gender: string }> {
-	const response = await fetch(`${process.env.REACT_APP_API_BASE_URL || 'http://127.0.0.1:8000'}/cases/${caseId}/segments/${segmentIndex}/gender`, {
+	const response = await fetch(`${API_BASE_URL}/cases/${caseId}/segments/${segmentIndex}/gender`, {
 		method: 'POST',
 	});
 	if (!response.ok) {
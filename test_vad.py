@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for mapping times on the voiced-only audio back to the recording.
+"""
+
+import sys
+
+import numpy as np
+
+from vad import to_original_time
+
+REGIONS = [[0.8, 2.2], [3.8, 5.2]]
+
+
+def test_segment_starting_on_a_join():
+    """A segment that starts where the second region begins maps into that region"""
+    # The voiced lengths sum to 1.4000000000000001, just past the diarizer's 1.4
+    start = to_original_time([1.4], REGIONS)
+    end = to_original_time([2.8], REGIONS, end=True)
+    assert np.allclose(start, [3.8]) and np.allclose(end, [5.2])
+
+
+def test_segment_ending_on_a_join():
+    """A segment that ends where the first region ends stays in that region"""
+    assert np.allclose(to_original_time([1.4000001], REGIONS, end=True), [2.2])
+    assert np.allclose(to_original_time([0.0], REGIONS), [0.8])
+
+
+def test_times_inside_regions():
+    """Times away from a join are offset by the silence removed before them"""
+    assert np.allclose(to_original_time([0.5, 2.0], REGIONS), [1.3, 4.4])
+    assert np.allclose(to_original_time([0.5, 2.0], REGIONS, end=True), [1.3, 4.4])
+
+
+def test_without_regions():
+    """Without voiced regions times are already on the original recording"""
+    assert np.allclose(to_original_time([1.0, 2.5], []), [1.0, 2.5])
+
+
+if __name__ == "__main__":
+    for test in (test_segment_starting_on_a_join, test_segment_ending_on_a_join,
+                 test_times_inside_regions, test_without_regions):
+        test()
+        print(f"✅ {test.__name__}")
+    sys.exit(0)
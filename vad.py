@@ -0,0 +1,145 @@
+"""
+Voice activity detection for skipping silence in the speech analyzers.
+
+Surveillance and wiretap recordings are often mostly silence or line
+noise. detect_speech finds the voiced regions once at ingest with a
+frame-energy detector whose threshold adapts to the recording's own noise
+floor. Transcription, gender detection and diarization then run on a copy
+that contains only those regions, and times reported on that copy are
+mapped back to the original recording with to_original_time.
+"""
+
+import wave
+
+import numpy as np
+
+VAD_SAMPLE_RATE = 16000
+VAD_FRAME_SECONDS = 0.02
+
+# A frame is voiced when its energy is this far above the noise floor
+VAD_THRESHOLD_DB = 9.0
+# Noise floor: this percentile of frame energies
+VAD_NOISE_PERCENTILE = 10
+
+# Pauses shorter than this stay inside one region; regions shorter than
+# VAD_MIN_SPEECH are dropped; each region is widened by VAD_PADDING
+VAD_MIN_SILENCE = 0.5
+VAD_MIN_SPEECH = 0.2
+VAD_PADDING = 0.2
+
+
+def speech_intervals(audio: np.ndarray, sample_rate: int) -> list:
+    """[[start, end], ...] in seconds of the voiced regions of a mono signal"""
+    frame = int(sample_rate * VAD_FRAME_SECONDS)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+    frames = audio[:n_frames * frame].reshape(n_frames, frame).astype(np.float64)
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    energy_db = 10 * np.log10((frames ** 2).mean(axis=1) + 1e-12)
+
+    noise_floor = np.percentile(energy_db, VAD_NOISE_PERCENTILE)
+    voiced = energy_db > noise_floor + VAD_THRESHOLD_DB
+
+    edges = np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(starts):
+        return []
+
+    padding = int(round(VAD_PADDING / VAD_FRAME_SECONDS))
+    starts = np.maximum(starts - padding, 0)
+    ends = np.minimum(ends + padding, n_frames)
+
+    # Bridge short pauses (and overlaps created by the padding)
+    breaks = (starts[1:] - ends[:-1]) >= int(round(VAD_MIN_SILENCE / VAD_FRAME_SECONDS))
+    starts = np.concatenate([starts[:1], starts[1:][breaks]])
+    ends = np.concatenate([ends[:-1][breaks], ends[-1:]])
+
+    long_enough = (ends - starts) >= int(round(VAD_MIN_SPEECH / VAD_FRAME_SECONDS))
+    duration = len(audio) / sample_rate
+    return [
+        [round(float(start) * VAD_FRAME_SECONDS, 3), round(min(float(end) * VAD_FRAME_SECONDS, duration), 3)]
+        for start, end in zip(starts[long_enough], ends[long_enough])
+    ]
+
+
+def detect_speech(audio_path: str) -> dict:
+    """Duration and voiced regions of an audio file"""
+    import librosa
+
+    audio, sample_rate = librosa.load(audio_path, sr=VAD_SAMPLE_RATE, mono=True)
+    return {
+        "duration": round(len(audio) / sample_rate, 3),
+        "intervals": speech_intervals(audio, sample_rate),
+    }
+
+
+def speech_seconds(intervals: list) -> float:
+    """Total length of the voiced regions"""
+    return float(sum(end - start for start, end in intervals or []))
+
+
+def write_voiced_audio(audio_path: str, intervals: list, out_path: str) -> list:
+    """Write only the voiced regions, back to back, as 16 kHz mono WAV
+
+    Returns the regions as actually written: each bound rounded to the
+    nearest sample and clipped to the recording, in seconds. Pass these,
+    not the detected intervals, to to_original_time.
+    """
+    import librosa
+
+    audio, sample_rate = librosa.load(audio_path, sr=VAD_SAMPLE_RATE, mono=True)
+    bounds = np.rint(np.asarray(intervals, dtype=np.float64).reshape(-1, 2) * sample_rate).astype(np.int64)
+    bounds = np.clip(bounds, 0, len(audio))
+    bounds = bounds[bounds[:, 1] > bounds[:, 0]]
+    voiced = np.concatenate([audio[start:end] for start, end in bounds]) if len(bounds) else audio[:0]
+    pcm = (np.clip(voiced, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(out_path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm.tobytes())
+    return [[int(start) / sample_rate, int(end) / sample_rate] for start, end in bounds]
+
+
+def write_clips(audio_path: str, clips: list):
+    """Write (start, end, out_path) spans of a recording as mono 16-bit WAVs at its own rate"""
+    import librosa
+
+    audio, sample_rate = librosa.load(audio_path, sr=None, mono=True)
+    for start, end, out_path in clips:
+        first = min(max(int(round(start * sample_rate)), 0), len(audio))
+        last = min(max(int(round(end * sample_rate)), first), len(audio))
+        pcm = (np.clip(audio[first:last], -1.0, 1.0) * 32767).astype("<i2")
+        with wave.open(out_path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(sample_rate)
+            out.writeframes(pcm.tobytes())
+
+
+def to_original_time(times, intervals: list, end: bool = False, tolerance: float = 1e-3) -> np.ndarray:
+    """Map times on the voiced-only audio back to the original recording
+
+    intervals are the regions returned by write_voiced_audio. A time within
+    tolerance of a join counts as on it, and maps to the end of the earlier
+    region when end is set (segment ends), otherwise to the start of the
+    later one (segment starts).
+    """
+    times = np.array(times, dtype=np.float64)
+    regions = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    if not len(regions):
+        return times
+    lengths = regions[:, 1] - regions[:, 0]
+    voiced_starts = np.concatenate([[0.0], np.cumsum(lengths)[:-1]])
+
+    # Snap times that round-tripped through another tool onto the join they mean
+    if times.size:
+        distance = np.abs(times.reshape(-1, 1) - voiced_starts)
+        nearest = voiced_starts[distance.argmin(axis=1)].reshape(times.shape)
+        times = np.where(distance.min(axis=1).reshape(times.shape) <= tolerance, nearest, times)
+
+    index = np.searchsorted(voiced_starts, times, side="left" if end else "right") - 1
+    index = np.clip(index, 0, len(regions) - 1)
+    return regions[index, 0] + np.clip(times - voiced_starts[index], 0.0, lengths[index])
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Analysis worker for multi-node deployments.
+
+Pulls analysis jobs from the shared job table and runs them against the
+case's stored audio, writing results back through AudioForensicsService.
+Start as many workers, on as many machines, as needed; they only share the
+database, the upload/static storage and (for live progress) Redis.
+
+Examples:
+    python worker.py                 # two jobs at a time until stopped
+    python worker.py --jobs 4        # four jobs at a time
+    python worker.py --once          # drain the queue, then exit
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+
+from analysis_pipeline import STAGES, AnalysisPipeline
+from analysis_pool import AnalyzerPool
+from database.connection import SessionLocal, create_tables
+from database.jobs import AnalysisJobQueue
+from database.services import AudioForensicsService
+from fingerprint import FingerprintIndex
+from progress import broker_from_env
+
+
+class AnalysisWorker:
+    """Claims queued analysis jobs and runs them with bounded concurrency"""
+
+    def __init__(self, pool: AnalyzerPool, jobs: int = 2, poll_interval: float = 2.0,
+                 lease_seconds: float = 300, worker_id: str = None, events=None, fingerprints=None):
+        self.pool = pool
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.events = events
+        self.fingerprints = fingerprints
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Stop claiming new jobs; jobs already running are finished"""
+        self._stopping.set()
+
+    def _claim(self):
+        db = SessionLocal()
+        try:
+            job = AnalysisJobQueue(db).claim(self.worker_id, self.lease_seconds)
+            return (job.id, job.case_id, job.stages, job.options or {}, job.attempts) if job else None
+        finally:
+            db.close()
+
+    async def run(self, once: bool = False):
+        """Process jobs until stopped (or, with once, until the queue is empty)"""
+        slots = asyncio.Semaphore(self.jobs)
+        in_flight = set()
+        while not self._stopping.is_set():
+            await slots.acquire()
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                slots.release()
+                if once and not in_flight:
+                    break
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process(*job))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def _keep_lease(self, job_id: str, job_task: asyncio.Task):
+        """Extend the job's lease until cancelled, so other workers leave it alone
+
+        If another worker has taken the job over, job_task is cancelled so
+        this worker stops writing results for it.
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            db = SessionLocal()
+            try:
+                if not AnalysisJobQueue(db).extend_lease(job_id, self.worker_id, self.lease_seconds):
+                    print(f"⚠️  Lost lease on job {job_id}, abandoning it")
+                    job_task.cancel()
+                    return
+            except Exception as e:
+                print(f"Error extending lease on job {job_id}: {e}")
+            finally:
+                db.close()
+
+    async def _process(self, job_id: str, case_id: str, stages, options: dict, attempts: int):
+        """Run one job in its own session and record the outcome"""
+        heartbeat = asyncio.create_task(self._keep_lease(job_id, asyncio.current_task()))
+        db = SessionLocal()
+        try:
+            service = AudioForensicsService(db)
+            queue = AnalysisJobQueue(db)
+            case = service.get_case(case_id)
+            if not case:
+                queue.complete(job_id)
+                print(f"⚠️  Job {job_id}: case {case_id} no longer exists, skipped")
+                return
+            if not os.path.exists(case.file_path):
+                queue.fail(job_id, f"Audio file missing at {case.file_path}")
+                print(f"❌ Job {job_id}: audio file missing at {case.file_path}")
+                return
+
+            stages = [stage for stage in STAGES if stage in (stages or STAGES)]
+            pipeline = AnalysisPipeline(service, self.pool, events=self.events, fingerprints=self.fingerprints)
+            try:
+                if options.get("stale_only"):
+                    # Stages finished by an earlier attempt are no longer stale
+                    ran = await pipeline.run_stale(case, case.file_path, stages=stages,
+                                                   force=options.get("force", False) and attempts == 1)
+                else:
+                    if attempts > 1:
+                        # A retry only redoes the stages the failed attempt did not finish
+                        stages = [stage for stage in stages if getattr(case, f"{stage}_completed") != "completed"]
+                    await pipeline.run(
+                        case, case.file_path, stages=stages,
+                        check_duplicates=options.get("check_duplicates", False),
+                        reuse_duplicates=options.get("reuse_duplicates", False)
+                    )
+                    ran = stages
+            except Exception as e:
+                db.rollback()
+                job = queue.fail(job_id, str(e))
+                retry = " (will retry)" if job and job.status == "queued" else ""
+                print(f"❌ Job {job_id} for case {case_id} failed{retry}: {e}")
+                return
+
+            queue.complete(job_id)
+            print(f"✅ Job {job_id} for case {case_id}: ran {', '.join(ran) or 'nothing'}")
+        except asyncio.CancelledError:
+            if not heartbeat.done():
+                raise
+            # Cancelled by _keep_lease: the job now belongs to another worker
+            db.rollback()
+            print(f"⚠️  Job {job_id} for case {case_id} abandoned after losing its lease")
+        except Exception as e:
+            print(f"Error processing job {job_id}: {e}")
+        finally:
+            heartbeat.cancel()
+            db.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued case analyses")
+    parser.add_argument("--jobs", type=int, default=int(os.getenv("WORKER_JOBS", "2")),
+                        help="Jobs processed in parallel")
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("WORKER_POLL_INTERVAL", "2")),
+                        help="Seconds to wait when the queue is empty")
+    parser.add_argument("--lease", type=float, default=float(os.getenv("WORKER_LEASE_SECONDS", "300")),
+                        help="Seconds before a job held by an unresponsive worker is retried elsewhere")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    pool = AnalyzerPool.from_env()
+    pool.workers = max(pool.workers, args.jobs)
+    pool.start()
+    events = broker_from_env()
+    worker = AnalysisWorker(
+        pool,
+        jobs=max(1, args.jobs),
+        poll_interval=args.poll_interval,
+        lease_seconds=args.lease,
+        events=events,
+        fingerprints=FingerprintIndex()
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:  # Windows
+            pass
+
+    print(f"Worker {worker.worker_id} started with {worker.jobs} job slot(s)")
+    try:
+        await worker.run(once=args.once)
+    finally:
+        pool.shutdown()
+        await events.close()
+    print(f"Worker {worker.worker_id} stopped")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    create_tables()
+    asyncio.run(main(args))